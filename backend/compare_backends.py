@@ -0,0 +1,81 @@
+"""
+Reports latency and mask agreement of every inference backend against the
+Keras reference on sample tiles.
+
+    python -m backend.compare_backends --tiles tile_1.npy tile_2.npy
+
+Sample tiles are scaled (512, 512, 4) model inputs saved with np.save. Without
+tiles, random synthetic inputs are used, which only makes the latency figures
+meaningful.
+"""
+import argparse
+import time
+import numpy as np
+from tensorflow.keras.models import load_model
+from backend.custom_layer import RepeatElements
+from backend.inference_backends import (
+    INFERENCE_BACKENDS,
+    create_backend,
+    synthetic_representative_data
+)
+
+
+def measure_backend(backend, img_batch: np.ndarray, repeats: int, batch_size: int):
+    """Returns the predictions and the median latency per image in ms."""
+    predicted_batch = backend.predict(img_batch, batch_size=batch_size)  # warm-up
+    latencies = []
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        backend.predict(img_batch, batch_size=batch_size)
+        latencies.append((time.perf_counter() - start_time) / len(img_batch) * 1000)
+    return predicted_batch[:, :, :, 0], float(np.median(latencies))
+
+
+def mask_agreement(reference_masks: np.ndarray, masks: np.ndarray):
+    """Returns the share of equal pixels and the IoU of the forest class."""
+    pixel_agreement = float(np.mean(reference_masks == masks))
+    union = np.logical_or(reference_masks, masks).sum()
+    intersection = np.logical_and(reference_masks, masks).sum()
+    iou = float(intersection / union) if union else 1.0
+    return pixel_agreement, iou
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n', maxsplit=1)[0].strip())
+    parser.add_argument('--model', default='./backend/model_ressources/att_unet_4b.hdf5')
+    parser.add_argument('--tiles', nargs='*', default=[])
+    parser.add_argument('--backends', nargs='*', default=list(INFERENCE_BACKENDS))
+    parser.add_argument('--threshold', type=float, default=0.7)
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    if args.tiles:
+        img_batch = np.stack([np.load(path) for path in args.tiles]).astype(np.float32)
+    else:
+        img_batch = np.stack(list(synthetic_representative_data(4)))
+    model = load_model(
+        filepath=args.model,
+        custom_objects={'RepeatElements': RepeatElements}
+    )
+
+    reference_masks = None
+    print(f"{'backend':<12} {'ms/image':>10} {'pixel agr.':>11} {'forest IoU':>11}")
+    for inference_backend in ['keras'] + [b for b in args.backends if b != 'keras']:
+        backend = create_backend(
+            model,
+            inference_backend,
+            representative_data=lambda: iter(img_batch)
+        )
+        predicted_batch, latency_ms = measure_backend(
+            backend, img_batch, args.repeats, args.batch_size
+        )
+        masks = predicted_batch > args.threshold
+        if reference_masks is None:
+            reference_masks = masks
+        pixel_agreement, iou = mask_agreement(reference_masks, masks)
+        print(f"{inference_backend:<12} {latency_ms:>10.1f} {pixel_agreement:>11.4f} {iou:>11.4f}")
+
+
+if __name__ == '__main__':
+    main()
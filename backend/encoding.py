@@ -0,0 +1,40 @@
+import io
+from typing import Dict
+import msgpack
+import numpy as np
+from PIL import Image
+
+
+MSGPACK_MEDIA_TYPE = 'application/x-msgpack'
+
+
+def pack_mask(mask: np.ndarray) -> bytes:
+    """Packs a black and white (0/255) mask into one bit per pixel."""
+    return np.packbits(mask > 0).tobytes()
+
+
+def compress_image(img_array: np.ndarray, image_format: str = 'PNG') -> bytes:
+    """Compresses a (height, width, 3) or (height, width) uint8 image array
+    losslessly."""
+    img_bytes = io.BytesIO()
+    Image.fromarray(img_array).save(img_bytes, format=image_format, optimize=False)
+    return img_bytes.getvalue()
+
+
+def to_msgpack(response_content: Dict, mask_keys=(), image_keys=()) -> bytes:
+    """
+    Serialises a response dict with msgpack. Lists of masks under mask_keys are
+    bit-packed and lists of uint8 images (RGB images or quantized probability
+    maps) under image_keys are PNG-compressed; the mask shape is stored once
+    under 'mask_shape'.
+    """
+    binary_content = dict(response_content)
+    for key in mask_keys:
+        masks = binary_content.get(key)
+        if masks:
+            binary_content['mask_shape'] = list(masks[0].shape)
+            binary_content[key] = [pack_mask(mask) for mask in masks]
+    for key in image_keys:
+        if key in binary_content:
+            binary_content[key] = [compress_image(img) for img in binary_content[key]]
+    return msgpack.packb(binary_content, use_bin_type=True)
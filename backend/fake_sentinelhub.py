@@ -0,0 +1,259 @@
+"""
+Local stand-in for the Sentinel Hub OAuth, Catalog and Process APIs, for
+end-to-end and load testing without credentials or network access.
+
+    python -m backend.fake_sentinelhub --port 8090 --catalog-latency-ms 300 --process-latency-ms 900
+
+Point the backend at it with SENTINELHUB_BASE_URL=http://localhost:8090 (any
+SENTINEL_CLIENT_ID and SENTINEL_CLIENT_SECRET will do). By default responses
+are synthetic: every fifth day has a scene with a deterministic cloud cover,
+and images are blocky random forest patterns. With --record-dir and
+--upstream, requests are forwarded to the real service (tokens too, so real
+credentials are needed) and the responses are stored; with --record-dir
+alone, stored responses are replayed and anything not recorded falls back to
+synthetic data.
+"""
+import io
+import os
+import json
+import base64
+import time
+import random
+import asyncio
+import hashlib
+import argparse
+import datetime as dt
+from typing import Optional
+import numpy as np
+import requests
+import tifffile
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+
+SCENE_INTERVAL_DAYS = 5
+UPSTREAM_TOKEN_URL = 'https://services.sentinel-hub.com/auth/realms/main/protocol/openid-connect/token'
+
+
+class FakeSentinelHubSettings:
+    """Latencies in ms (each multiplied by a random factor within
+    1 +- jitter), the recording directory and the upstream service."""
+
+    def __init__(
+            self,
+            catalog_latency_ms: float = 0,
+            process_latency_ms: float = 0,
+            jitter: float = 0.2,
+            record_dir: Optional[str] = None,
+            upstream: Optional[str] = None
+        ):
+        self.catalog_latency_ms = catalog_latency_ms
+        self.process_latency_ms = process_latency_ms
+        self.jitter = jitter
+        self.record_dir = record_dir
+        self.upstream = upstream
+
+
+settings = FakeSentinelHubSettings()
+app = FastAPI()
+
+
+async def simulate_latency(latency_ms: float) -> None:
+    if latency_ms > 0:
+        factor = 1 + random.uniform(-settings.jitter, settings.jitter)
+        await asyncio.sleep(latency_ms * factor / 1000)
+
+
+def recording_path(path: str, body: bytes) -> str:
+    key = hashlib.sha256(path.encode('utf-8') + b'\n' + body).hexdigest()
+    return os.path.join(settings.record_dir, f'{key}.json')
+
+
+def replay(path: str, body: bytes) -> Optional[Response]:
+    """Returns the recorded response of a request, or None."""
+    if not settings.record_dir:
+        return None
+    try:
+        with open(recording_path(path, body), encoding='utf-8') as file:
+            recording = json.load(file)
+    except FileNotFoundError:
+        return None
+    return Response(
+        content=bytes.fromhex(recording['content']),
+        status_code=recording['status_code'],
+        media_type=recording['media_type']
+    )
+
+
+def record(path: str, body: bytes, authorization: str) -> Response:
+    """Forwards a request to the upstream service and stores its response."""
+    upstream_response = requests.post(
+        f"{settings.upstream}{path}",
+        data=body,
+        headers={
+            'Authorization': authorization,
+            'Content-Type': 'application/json',
+            'Accept': '*/*'
+        },
+        timeout=120
+    )
+    media_type = upstream_response.headers.get('content-type', 'application/octet-stream')
+    if upstream_response.ok:
+        os.makedirs(settings.record_dir, exist_ok=True)
+        with open(recording_path(path, body), 'w', encoding='utf-8') as file:
+            json.dump({
+                'status_code': upstream_response.status_code,
+                'media_type': media_type,
+                'content': upstream_response.content.hex()
+            }, file)
+    return Response(
+        content=upstream_response.content,
+        status_code=upstream_response.status_code,
+        media_type=media_type
+    )
+
+
+def scene_cloud_cover(scene_date: dt.date) -> float:
+    """Deterministic cloud cover in percent, mostly clear with cloudy spells."""
+    rng = np.random.default_rng(scene_date.toordinal())
+    return round(float(rng.choice([rng.uniform(0, 10), rng.uniform(10, 100)], p=[0.6, 0.4])), 2)
+
+
+def synthetic_catalog_features(payload: dict) -> list:
+    start, end = payload['datetime'].split('/')
+    start_date = dt.date.fromisoformat(start[:10])
+    end_date = dt.date.fromisoformat(end[:10])
+    max_cloud_cover = 100.0
+    if 'eo:cloud_cover <' in str(payload.get('filter', '')):
+        max_cloud_cover = float(str(payload['filter']).split('<')[1].strip().split()[0])
+    first_scene = start_date.toordinal() + (-start_date.toordinal()) % SCENE_INTERVAL_DAYS
+    features = []
+    for ordinal in range(first_scene, end_date.toordinal() + 1, SCENE_INTERVAL_DAYS):
+        scene_date = dt.date.fromordinal(ordinal)
+        cloud_cover = scene_cloud_cover(scene_date)
+        if cloud_cover < max_cloud_cover:
+            features.append({
+                "type": "Feature",
+                "id": f"S2A_MSIL2A_{scene_date:%Y%m%d}T140000_FAKE",
+                "properties": {
+                    "datetime": f"{scene_date.isoformat()}T14:00:00Z",
+                    "eo:cloud_cover": cloud_cover
+                }
+            })
+    return features
+
+
+def synthetic_scene(payload: dict) -> bytes:
+    """Returns a (height, width, 4) float32 TIFF like the 'Combined'
+    evalscript output, seeded by the requested area and time range."""
+    output = payload.get('output', {})
+    width, height = int(output.get('width', 512)), int(output.get('height', 512))
+    seed_content = json.dumps(
+        [payload.get('input', {}).get('bounds'), payload.get('input', {}).get('data')],
+        sort_keys=True
+    )
+    rng = np.random.default_rng(int(hashlib.sha256(seed_content.encode()).hexdigest()[:8], 16))
+    coarse = rng.random((max(height // 32, 2), max(width // 32, 2)))
+    forest = np.kron(coarse, np.ones((32, 32)))[:height, :width]
+    forest = np.pad(forest, ((0, height - forest.shape[0]), (0, width - forest.shape[1])), mode='edge')
+    noise = rng.normal(0, 0.01, (height, width, 3))
+    red = np.where(forest > 0.4, 0.05, 0.2)[:, :, np.newaxis]
+    true_color = np.clip(2.5 * (red * np.array([0.8, 1.2, 1.0]) + noise), 0, 1)
+    nir = np.where(forest > 0.4, 3500, 1800) + rng.normal(0, 100, (height, width))
+    scene = np.dstack((true_color, nir)).astype(np.float32)
+    tiff_bytes = io.BytesIO()
+    tifffile.imwrite(tiff_bytes, scene)
+    return tiff_bytes.getvalue()
+
+
+def fake_access_token(client_id: str) -> str:
+    """Returns a JWT-shaped token, since sentinelhub decodes the payload to
+    cache sessions per client ID. The payload is padded with spaces to a
+    multiple of 3 bytes, so its base64 form needs no padding."""
+    payload = json.dumps({"azp": client_id, "exp": int(time.time()) + 3600})
+    payload += ' ' * (-len(payload) % 3)
+    encoded_payload = base64.b64encode(payload.encode()).decode()
+    return f"fake.{encoded_payload}.signature"
+
+
+@app.post("/oauth/token")
+async def token(request: Request):
+    if settings.upstream:
+        upstream_response = await asyncio.to_thread(
+            requests.post,
+            UPSTREAM_TOKEN_URL,
+            data=await request.body(),
+            headers={'Content-Type': 'application/x-www-form-urlencoded'},
+            timeout=30
+        )
+        return Response(
+            content=upstream_response.content,
+            status_code=upstream_response.status_code,
+            media_type=upstream_response.headers.get('content-type')
+        )
+    form = dict(item.split('=', 1) for item in (await request.body()).decode().split('&') if '=' in item)
+    return {
+        "access_token": fake_access_token(form.get('client_id', 'fake-client')),
+        "token_type": "Bearer",
+        "expires_in": 3600,
+        "expires_at": time.time() + 3600
+    }
+
+
+@app.post("/api/v1/catalog/1.0.0/search")
+async def catalog_search(request: Request):
+    body = await request.body()
+    await simulate_latency(settings.catalog_latency_ms)
+    if settings.upstream and settings.record_dir:
+        return await asyncio.to_thread(
+            record, request.url.path, body, request.headers.get('authorization', '')
+        )
+    recorded_response = replay(request.url.path, body)
+    if recorded_response is not None:
+        return recorded_response
+    features = synthetic_catalog_features(json.loads(body))
+    return JSONResponse(content={
+        "type": "FeatureCollection",
+        "features": features,
+        "links": [],
+        "context": {"limit": len(features), "returned": len(features)}
+    })
+
+
+@app.post("/api/v1/process")
+async def process(request: Request):
+    body = await request.body()
+    await simulate_latency(settings.process_latency_ms)
+    if settings.upstream and settings.record_dir:
+        return await asyncio.to_thread(
+            record, request.url.path, body, request.headers.get('authorization', '')
+        )
+    recorded_response = replay(request.url.path, body)
+    if recorded_response is not None:
+        return recorded_response
+    tiff_bytes = await asyncio.to_thread(synthetic_scene, json.loads(body))
+    return Response(content=tiff_bytes, media_type='image/tiff')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n', maxsplit=1)[0].strip())
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--catalog-latency-ms', type=float, default=0)
+    parser.add_argument('--process-latency-ms', type=float, default=0)
+    parser.add_argument('--jitter', type=float, default=0.2)
+    parser.add_argument('--record-dir')
+    parser.add_argument('--upstream', help='e.g. https://services.sentinel-hub.com, records if given')
+    args = parser.parse_args()
+    settings.catalog_latency_ms = args.catalog_latency_ms
+    settings.process_latency_ms = args.process_latency_ms
+    settings.jitter = args.jitter
+    settings.record_dir = args.record_dir
+    settings.upstream = args.upstream
+
+    import uvicorn
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
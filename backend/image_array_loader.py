@@ -1,62 +1,119 @@
-from typing import List
-from sentinelhub import SentinelHubDownloadClient
+from typing import List, Tuple
+import numpy as np
+from sentinelhub import BBox, SHConfig
+from sentinelhub.download import DownloadRequest
+from backend.imagery_cache import imagery_cache, request_cache_key
+from backend.instrumentation import stage_timer, record_bytes
 from backend.sentinelhub_requester import (
-    search_optimal_l2a_tiles,
+    search_optimal_l2a_tiles_for_dates,
     create_sentinelhub_token,
     create_bounding_box,
-    build_sentinel_request
+    build_sentinel_request,
+    sentinelhub_pool
 )
 
 
-def load_images_from_satellite(
+def find_available_tiles(
         lat_deg: float,
         lon_deg: float,
-        date_list: List[str]
-    ):
-    """Loads available image arrays from sentinel hub at multiple times."""
+        date_list: List[str],
+        image_size_px: int = 512
+    ) -> Tuple[SHConfig, BBox, List[dict]]:
+    """Searches the optimal tile for every requested date. Returns the
+    configuration, the bounding box and the found tiles, skipping dates
+    without an available tile."""
     box = create_bounding_box(
         lat_deg=lat_deg,
         lon_deg=lon_deg,
-        image_size_px=512,
+        image_size_px=image_size_px,
         resolution_m_per_px=10
     )
     config, catalog_ = create_sentinelhub_token()
-    date_list_available = []
-    for date_i in date_list:
-        optimal_tile = search_optimal_l2a_tiles(
-            catalog=catalog_,
-            bbox=box,
-            date_request=date_i,
-            range_days=91,
-            max_cloud_coverage=10
-        )
-        if optimal_tile:
-           date_list_available.append(optimal_tile.get('date'))
-    list_of_requests_vis= [
-        build_sentinel_request(
-            config=config,
-            box=box,
-            request_type='TrueColor',
-            request_date=(date_i, date_i)
-        )
-        for date_i in date_list_available
+    optimal_tiles = search_optimal_l2a_tiles_for_dates(
+        catalog=catalog_,
+        bbox=box,
+        date_list=date_list,
+        range_days=91,
+        max_cloud_coverage=10
+    )
+    available_tiles = [
+        optimal_tile
+        for optimal_tile in optimal_tiles
+        if optimal_tile
     ]
-    list_of_requests_fourband= [
+    return config, box, available_tiles
+
+
+def build_download_requests(
+        config: SHConfig,
+        box: BBox,
+        date_list: List[str],
+        image_size_px: int = 512
+    ) -> List[DownloadRequest]:
+    """Builds one combined true color and B08 download request per date."""
+    list_of_requests = [
         build_sentinel_request(
             config=config,
             box=box,
-            request_type='4-band',
-            request_date=(date_i, date_i)
+            request_type='Combined',
+            request_date=(date_i, date_i),
+            image_size_px=image_size_px
         )
-        for date_i in date_list_available
+        for date_i in date_list
     ]
-    list_of_requests = list_of_requests_vis + list_of_requests_fourband
-    list_of_requests = [
+    return [
         request.download_list[0]
         for request in list_of_requests
     ]
-    img_arrays = SentinelHubDownloadClient(config=config).download(
-        list_of_requests,
-        max_threads=5
+
+
+def download_images(
+        config: SHConfig,
+        list_of_requests: List[DownloadRequest],
+        max_threads: int = 5
+    ) -> List[np.ndarray]:
+    """Serves previously downloaded arrays from the imagery cache and
+    downloads the rest over the pooled Sentinel Hub connections."""
+    cache_keys = [
+        request_cache_key(request.post_values)
+        for request in list_of_requests
+    ]
+    img_arrays = [imagery_cache.get(key) for key in cache_keys]
+    missing_indices = [i for i, img in enumerate(img_arrays) if img is None]
+    if missing_indices:
+        with stage_timer('download'):
+            downloaded_arrays = sentinelhub_pool.client(config=config).download(
+                [list_of_requests[i] for i in missing_indices],
+                max_threads=max_threads
+            )
+        for i, img_array in zip(missing_indices, downloaded_arrays):
+            record_bytes('download', img_array.nbytes)
+            imagery_cache.put(cache_keys[i], img_array)
+            img_arrays[i] = img_array
+    return img_arrays
+
+
+def load_images_from_satellite(
+        lat_deg: float,
+        lon_deg: float,
+        date_list: List[str],
+        image_size_px: int = 512
+    ):
+    """Loads available image arrays from sentinel hub at multiple times.
+    Returns the loaded dates and one (size, size, 4) array per date, holding the
+    true color channels followed by the B08 band."""
+    config, box, available_tiles = find_available_tiles(
+        lat_deg=lat_deg,
+        lon_deg=lon_deg,
+        date_list=date_list,
+        image_size_px=image_size_px
+    )
+    date_list_available = [tile.get('date') for tile in available_tiles]
+    list_of_requests = build_download_requests(
+        config=config,
+        box=box,
+        date_list=date_list_available,
+        image_size_px=image_size_px
     )
+    img_arrays = download_images(config, list_of_requests)
     return date_list_available, img_arrays
@@ -0,0 +1,92 @@
+import os
+import json
+import hashlib
+import threading
+from typing import Dict, Optional
+import numpy as np
+from backend.instrumentation import record_cache_lookup
+
+
+IMAGERY_CACHE_DIR = os.getenv('IMAGERY_CACHE_DIR', '/tmp/forestvision/imagery_cache')
+IMAGERY_CACHE_MAX_BYTES = int(os.getenv('IMAGERY_CACHE_MAX_BYTES', str(2 * 1024 ** 3)))
+
+
+def request_cache_key(post_values: dict) -> str:
+    """
+    Returns a content address for a Process API request. The request body
+    holds the bounding box, acquisition time range, evalscript and output size,
+    so identical requests always map to the same key.
+    """
+    serialized = json.dumps(post_values, sort_keys=True, default=str)
+    return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+
+class ImageryCache:
+    """
+    Size-bounded on-disk cache of downloaded image arrays. Arrays are stored
+    as .npy files named by their content address and read back memory-mapped.
+    The least recently used files are evicted once max_bytes is exceeded.
+    """
+
+    def __init__(self, cache_dir: str = IMAGERY_CACHE_DIR, max_bytes: int = IMAGERY_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._sizes: Dict[str, int] = {
+            file_name: os.path.getsize(os.path.join(self.cache_dir, file_name))
+            for file_name in os.listdir(self.cache_dir)
+            if file_name.endswith('.npy')
+        }
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f'{key}.npy')
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """Returns the cached array as a read-only memory map, or None."""
+        path = self._path(key)
+        try:
+            img_array = np.load(path, mmap_mode='r')
+            os.utime(path)
+        except (FileNotFoundError, ValueError):
+            record_cache_lookup('imagery', hit=False)
+            return None
+        record_cache_lookup('imagery', hit=True)
+        return img_array
+
+    def put(self, key: str, img_array: np.ndarray) -> None:
+        """Stores an array atomically and evicts old entries if necessary."""
+        path = self._path(key)
+        temporary_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(temporary_path, 'wb') as file:
+            np.save(file, np.asarray(img_array))
+        os.replace(temporary_path, path)
+        with self._lock:
+            self._sizes[os.path.basename(path)] = os.path.getsize(path)
+            self._evict()
+
+    def _evict(self) -> None:
+        total_bytes = sum(self._sizes.values())
+        if total_bytes <= self.max_bytes:
+            return
+        by_last_access = sorted(
+            self._sizes,
+            key=lambda file_name: self._last_access(file_name)
+        )
+        for file_name in by_last_access:
+            if total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, file_name))
+            except FileNotFoundError:
+                pass
+            total_bytes -= self._sizes.pop(file_name)
+
+    def _last_access(self, file_name: str) -> float:
+        try:
+            return os.path.getmtime(os.path.join(self.cache_dir, file_name))
+        except FileNotFoundError:
+            return 0.0
+
+
+imagery_cache = ImageryCache()
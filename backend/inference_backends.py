@@ -0,0 +1,149 @@
+import os
+import threading
+from typing import Callable, Iterator, Optional
+import numpy as np
+
+
+INPUT_SHAPE = (512, 512, 4)
+INFERENCE_BACKENDS = ('keras', 'xla', 'tflite', 'tflite-fp16', 'tflite-int8')
+XLA_BATCH_SIZE = int(os.getenv('XLA_BATCH_SIZE', '8'))
+
+
+class KerasBackend:
+    """Reference backend, the stock Keras predict loop."""
+
+    def __init__(self, model):
+        self.model = model
+
+    def predict(self, img_batch: np.ndarray, batch_size: int = 8, verbose: int = 0) -> np.ndarray:
+        return self.model.predict(img_batch, batch_size=batch_size, verbose=verbose)
+
+
+class XLABackend:
+    """
+    Runs the model as an XLA-compiled tf.function with a fixed
+    (batch_size, 512, 512, 4) signature, which skips the Keras predict loop
+    and is compiled only once. Batches are processed in chunks of batch_size,
+    smaller chunks are padded with zeros, whatever batch_size predict is
+    called with.
+    """
+
+    def __init__(self, model, batch_size: int = XLA_BATCH_SIZE, input_shape=INPUT_SHAPE):
+        import tensorflow as tf
+        self.model = model
+        self.batch_size = batch_size
+        self._predict_function = tf.function(
+            lambda img_batch: model(img_batch, training=False),
+            input_signature=[tf.TensorSpec((batch_size, *input_shape), tf.float32)],
+            jit_compile=True
+        )
+
+    def predict(self, img_batch: np.ndarray, batch_size: int = 8, verbose: int = 0) -> np.ndarray:
+        import tensorflow as tf
+        predicted_chunks = []
+        for start in range(0, len(img_batch), self.batch_size):
+            chunk = np.asarray(img_batch[start:start + self.batch_size], dtype=np.float32)
+            padded_chunk = np.zeros((self.batch_size, *chunk.shape[1:]), dtype=np.float32)
+            padded_chunk[:len(chunk)] = chunk
+            predicted_chunks.append(
+                self._predict_function(tf.constant(padded_chunk)).numpy()[:len(chunk)]
+            )
+        return np.concatenate(predicted_chunks)
+
+
+class TFLiteBackend:
+    """
+    Runs a TensorFlow Lite conversion of the model. quantization is None for a
+    float32 conversion, 'fp16' for float16 weights or 'int8' for int8 weights
+    and activations calibrated on representative_data, which is required.
+    Inputs and outputs stay float32 and ops without an int8 kernel fall back
+    to float, so it is not a full integer model. The interpreter is not
+    thread-safe, so predict calls are serialised.
+    """
+
+    def __init__(
+            self,
+            model,
+            quantization: Optional[str] = None,
+            representative_data: Optional[Callable[[], Iterator[np.ndarray]]] = None,
+            input_shape=INPUT_SHAPE
+        ):
+        import tensorflow as tf
+        self.quantization = quantization
+        concrete_function = tf.function(
+            lambda img_batch: model(img_batch, training=False)
+        ).get_concrete_function(tf.TensorSpec((1, *input_shape), tf.float32))
+        converter = tf.lite.TFLiteConverter.from_concrete_functions([concrete_function])
+        if quantization == 'fp16':
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+            converter.target_spec.supported_types = [tf.float16]
+        elif quantization == 'int8':
+            if representative_data is None:
+                raise ValueError(
+                    "int8 quantization needs representative calibration tiles, "
+                    "see calibration_data_from_directory."
+                )
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+            converter.representative_dataset = lambda: (
+                [np.expand_dims(img_array, axis=0).astype(np.float32)]
+                for img_array in representative_data()
+            )
+        self.tflite_model = converter.convert()
+        self._interpreter = tf.lite.Interpreter(model_content=self.tflite_model)
+        self._interpreter.allocate_tensors()
+        self._input_index = self._interpreter.get_input_details()[0]['index']
+        self._output_index = self._interpreter.get_output_details()[0]['index']
+        self._lock = threading.Lock()
+
+    def predict(self, img_batch: np.ndarray, batch_size: int = 8, verbose: int = 0) -> np.ndarray:
+        predicted_imgs = []
+        with self._lock:
+            for img_array in img_batch:
+                self._interpreter.set_tensor(
+                    self._input_index,
+                    np.expand_dims(img_array, axis=0).astype(np.float32)
+                )
+                self._interpreter.invoke()
+                predicted_imgs.append(self._interpreter.get_tensor(self._output_index)[0])
+        return np.stack(predicted_imgs)
+
+
+def synthetic_representative_data(number_of_samples: int = 16) -> Iterator[np.ndarray]:
+    """Yields random scaled image arrays. Only good for latency measurements,
+    int8 calibration on noise gives poor masks."""
+    rng = np.random.default_rng(0)
+    for _ in range(number_of_samples):
+        yield rng.random(INPUT_SHAPE, dtype=np.float32)
+
+
+def calibration_data_from_directory(directory: str) -> Optional[Callable[[], Iterator[np.ndarray]]]:
+    """Returns representative data yielding the scaled (512, 512, 4) model
+    inputs saved with np.save in directory, or None if there are none."""
+    if not directory or not os.path.isdir(directory):
+        return None
+    paths = sorted(
+        os.path.join(directory, file_name)
+        for file_name in os.listdir(directory)
+        if file_name.endswith('.npy')
+    )
+    if not paths:
+        return None
+    return lambda: (np.load(path).astype(np.float32) for path in paths)
+
+
+def create_backend(model, inference_backend: str = 'keras', representative_data=None):
+    """Wraps a loaded Keras model into the requested inference backend."""
+    if inference_backend == 'keras':
+        return KerasBackend(model)
+    if inference_backend == 'xla':
+        return XLABackend(model)
+    if inference_backend == 'tflite':
+        return TFLiteBackend(model)
+    if inference_backend == 'tflite-fp16':
+        return TFLiteBackend(model, quantization='fp16')
+    if inference_backend == 'tflite-int8':
+        return TFLiteBackend(model, quantization='int8', representative_data=representative_data)
+    raise ValueError(
+        f"Unknown inference backend '{inference_backend}', "
+        f"choose one of {', '.join(INFERENCE_BACKENDS)}."
+    )
@@ -0,0 +1,128 @@
+import os
+import time
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Dict, List, Tuple
+import numpy as np
+from backend.segmenter import predict_batch, quantize_probabilities
+from backend.instrumentation import stage_timer
+
+
+INFERENCE_MAX_BATCH_SIZE = int(os.getenv('INFERENCE_MAX_BATCH_SIZE', '8'))
+INFERENCE_MAX_WAIT_MS = float(os.getenv('INFERENCE_MAX_WAIT_MS', '10'))
+
+
+class InferenceScheduler:
+    """
+    In-process dynamic micro-batching for segmentation. Work submitted by all
+    requests is queued; a single worker thread collects up to max_batch_size
+    images (or whatever arrived within max_wait_ms of the first one) that share
+    the same model, runs one predict and routes every mask back to its future.
+    """
+
+    def __init__(
+            self,
+            max_batch_size: int = INFERENCE_MAX_BATCH_SIZE,
+            max_wait_ms: float = INFERENCE_MAX_WAIT_MS
+        ):
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._queue: queue.Queue = queue.Queue()
+        self._pending: List[Tuple] = []
+        self._worker = None
+        self._worker_lock = threading.Lock()
+        self.batches_run = 0
+        self.images_run = 0
+        self.last_batch_size = 0
+
+    def submit(self, model, img_array: np.ndarray, threshold: float = 0.7) -> Future:
+        """Queues one scaled image array. Returns a future resolving to its
+        (512, 512) black and white img_array and its uint8 quantized
+        probability map."""
+        future: Future = Future()
+        self._queue.put((model, img_array, threshold, future))
+        self._ensure_worker()
+        return future
+
+    def stats(self) -> Dict:
+        return {
+            "queue_depth": self._queue.qsize() + len(self._pending),
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "batches_run": self.batches_run,
+            "images_run": self.images_run,
+            "mean_batch_size": self.images_run / self.batches_run if self.batches_run else 0,
+            "last_batch_size": self.last_batch_size
+        }
+
+    def _ensure_worker(self) -> None:
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._run,
+                    name='inference-scheduler',
+                    daemon=True
+                )
+                self._worker.start()
+
+    def _next_item(self, timeout=None):
+        if self._pending:
+            return self._pending.pop(0)
+        return self._queue.get(timeout=timeout)
+
+    def _collect_batch(self) -> List[Tuple]:
+        batch = [self._next_item()]
+        model = batch[0][0]
+        deadline = time.monotonic() + self.max_wait_ms / 1000
+        skipped = []
+        while len(batch) < self.max_batch_size:
+            remaining_time = deadline - time.monotonic()
+            if remaining_time <= 0:
+                break
+            try:
+                item = self._next_item(timeout=remaining_time)
+            except queue.Empty:
+                break
+            # Only work for the same model can share a predict call.
+            (batch if item[0] is model else skipped).append(item)
+        self._pending = skipped + self._pending
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            # Futures of cancelled requests are dropped; the others are
+            # marked running, so they can no longer be cancelled under us.
+            batch = [
+                item for item in self._collect_batch()
+                if item[3].set_running_or_notify_cancel()
+            ]
+            if not batch:
+                continue
+            model = batch[0][0]
+            try:
+                with stage_timer('predict'):
+                    predicted_batch = predict_batch(
+                        [item[1] for item in batch],
+                        model,
+                        batch_size=len(batch)
+                    )
+            except Exception as error:
+                for item in batch:
+                    item[3].set_exception(error)
+                continue
+            for (_, _, threshold, future), predicted_img_array in zip(batch, predicted_batch):
+                try:
+                    future.set_result((
+                        (predicted_img_array > threshold).astype(np.uint8) * 255,
+                        quantize_probabilities(predicted_img_array)
+                    ))
+                except Exception as error:
+                    if not future.done():
+                        future.set_exception(error)
+            self.batches_run += 1
+            self.images_run += len(batch)
+            self.last_batch_size = len(batch)
+
+
+inference_scheduler = InferenceScheduler()
@@ -0,0 +1,88 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+from prometheus_client import Counter, Gauge, Histogram
+
+
+STAGE_SECONDS = Histogram(
+    'forestvision_stage_seconds',
+    'Time spent per processing stage.',
+    ['stage'],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+)
+STAGE_BYTES = Counter(
+    'forestvision_stage_bytes_total',
+    'Bytes produced per processing stage.',
+    ['stage']
+)
+CACHE_REQUESTS = Counter(
+    'forestvision_cache_requests_total',
+    'Cache lookups by cache and result (hit or miss).',
+    ['cache', 'result']
+)
+REQUEST_SECONDS = Histogram(
+    'forestvision_request_seconds',
+    'Request latency per endpoint.',
+    ['endpoint'],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    'forestvision_requests_in_flight',
+    'Requests currently being processed.'
+)
+STARTUP_SECONDS = Gauge(
+    'forestvision_startup_seconds',
+    'Time spent per startup phase, total is the time until the server is ready.',
+    ['phase']
+)
+
+# Stage durations of the current request, read for the Server-Timing header.
+# Threads started with asyncio.to_thread share the list through the copied
+# context; the inference scheduler's worker thread only reports to Prometheus.
+_request_timings: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar(
+    'request_timings', default=None
+)
+
+
+@contextmanager
+def stage_timer(stage: str):
+    """Times the enclosed block as the given stage."""
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start_time)
+
+
+def record_stage(stage: str, seconds: float) -> None:
+    STAGE_SECONDS.labels(stage).observe(seconds)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((stage, seconds))
+
+
+def record_bytes(stage: str, number_of_bytes: int) -> None:
+    STAGE_BYTES.labels(stage).inc(number_of_bytes)
+
+
+def record_cache_lookup(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+def start_request_timings() -> List[Tuple[str, float]]:
+    """Starts collecting the stage durations of the current request."""
+    timings = []
+    _request_timings.set(timings)
+    return timings
+
+
+def server_timing_header(timings: List[Tuple[str, float]]) -> str:
+    """Sums the durations per stage into a Server-Timing header value."""
+    durations: Dict[str, float] = {}
+    for stage, seconds in list(timings):
+        durations[stage] = durations.get(stage, 0) + seconds
+    return ', '.join(
+        f'{stage};dur={seconds * 1000:.1f}'
+        for stage, seconds in durations.items()
+    )
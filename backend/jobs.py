@@ -0,0 +1,160 @@
+import os
+import json
+import uuid
+import sqlite3
+import datetime as dt
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+
+JOBS_DB_PATH = os.getenv('JOBS_DB_PATH', '/tmp/forestvision/jobs.sqlite3')
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '4'))
+ITEM_FIELDS = ('latitude', 'longitude', 'start_timeframe', 'end_timeframe', 'sample_number')
+
+
+class JobQueue:
+    """
+    Batch analysis jobs backed by a local SQLite database. A job is a list of
+    items (latitude, longitude, start_timeframe, end_timeframe, sample_number)
+    which a worker pool processes with process_item. Identical items within a
+    job are processed only once. Results survive restarts, and unfinished
+    items are picked up again by resume().
+    """
+
+    def __init__(
+            self,
+            process_item: Callable[..., Dict],
+            db_path: str = JOBS_DB_PATH,
+            max_workers: int = JOB_WORKERS
+        ):
+        self.process_item = process_item
+        self.db_path = db_path
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='jobs')
+        os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+        with self._connect() as connection:
+            connection.executescript("""
+                PRAGMA journal_mode=WAL;
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    created_at TEXT NOT NULL,
+                    options TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS job_items (
+                    job_id TEXT NOT NULL,
+                    item_index INTEGER NOT NULL,
+                    item TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    PRIMARY KEY (job_id, item_index)
+                );
+            """)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def submit(self, items: List[Dict], options: Optional[Dict] = None) -> str:
+        """Stores a new job and queues its items. Returns the job id."""
+        job_id = uuid.uuid4().hex
+        options = options or {}
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT INTO jobs VALUES (?, ?, ?)",
+                (job_id, dt.datetime.utcnow().isoformat(), json.dumps(options))
+            )
+            connection.executemany(
+                "INSERT INTO job_items (job_id, item_index, item, status) VALUES (?, ?, ?, 'queued')",
+                [
+                    (job_id, index, json.dumps({field: item[field] for field in ITEM_FIELDS}))
+                    for index, item in enumerate(items)
+                ]
+            )
+        self._schedule(job_id)
+        return job_id
+
+    def resume(self) -> None:
+        """Requeues the items of all unfinished jobs, e.g. after a restart."""
+        with self._connect() as connection:
+            job_ids = [
+                row[0] for row in connection.execute(
+                    "SELECT DISTINCT job_id FROM job_items WHERE status IN ('queued', 'running')"
+                )
+            ]
+        for job_id in job_ids:
+            self._schedule(job_id)
+
+    def _schedule(self, job_id: str) -> None:
+        with self._connect() as connection:
+            options = json.loads(connection.execute(
+                "SELECT options FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()[0])
+            rows = connection.execute(
+                "SELECT item_index, item FROM job_items "
+                "WHERE job_id = ? AND status IN ('queued', 'running')",
+                (job_id,)
+            ).fetchall()
+        # Deduplicate identical items, they share one run and its imagery.
+        indices_by_item: Dict[str, List[int]] = {}
+        for item_index, item in rows:
+            indices_by_item.setdefault(item, []).append(item_index)
+        for item, item_indices in indices_by_item.items():
+            self.executor.submit(self._run, job_id, item_indices, json.loads(item), options)
+
+    def _run(self, job_id: str, item_indices: List[int], item: Dict, options: Dict) -> None:
+        self._update(job_id, item_indices, status='running')
+        try:
+            result = self.process_item(**item, **options)
+        except Exception as error:
+            self._update(job_id, item_indices, status='failed', error=repr(error))
+        else:
+            self._update(job_id, item_indices, status='done', result=json.dumps(result))
+
+    def _update(self, job_id: str, item_indices: List[int], status: str, result=None, error=None) -> None:
+        with self._connect() as connection:
+            connection.executemany(
+                "UPDATE job_items SET status = ?, result = ?, error = ? "
+                "WHERE job_id = ? AND item_index = ?",
+                [(status, result, error, job_id, index) for index in item_indices]
+            )
+
+    def status(self, job_id: str) -> Optional[Dict]:
+        """Returns the number of items per status, or None for unknown jobs."""
+        with self._connect() as connection:
+            job = connection.execute(
+                "SELECT created_at FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+            if job is None:
+                return None
+            counts = dict(connection.execute(
+                "SELECT status, COUNT(*) FROM job_items WHERE job_id = ? GROUP BY status",
+                (job_id,)
+            ).fetchall())
+        number_of_items = sum(counts.values())
+        return {
+            "job_id": job_id,
+            "created_at": job[0],
+            "number_of_items": number_of_items,
+            "item_status_counts": counts,
+            "finished": counts.get('done', 0) + counts.get('failed', 0) == number_of_items
+        }
+
+    def results(self, job_id: str) -> Optional[List[Dict]]:
+        """Returns every item with its status, result and error, or None for
+        unknown jobs."""
+        if self.status(job_id) is None:
+            return None
+        with self._connect() as connection:
+            rows = connection.execute(
+                "SELECT item, status, result, error FROM job_items "
+                "WHERE job_id = ? ORDER BY item_index",
+                (job_id,)
+            ).fetchall()
+        return [
+            {
+                "item": json.loads(item),
+                "status": status,
+                "result": json.loads(result) if result else None,
+                "error": error
+            }
+            for item, status, result, error in rows
+        ]
@@ -0,0 +1,107 @@
+"""
+Drives /get_satellite_images at a fixed concurrency and reports latency
+percentiles and throughput.
+
+    python -m backend.load_test --url http://localhost:8080 --concurrency 8 --requests 200
+
+Run the backend against backend.fake_sentinelhub for reproducible numbers
+without credentials. Every request uses one of --locations distinct
+coordinates around the default location, so the share of cache hits can be
+controlled: one location measures the warm path, many the cold one.
+"""
+import time
+import argparse
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import requests
+
+
+def request_params(request_index: int, args) -> dict:
+    location_index = request_index % args.locations
+    return {
+        'start_timeframe': args.start_timeframe,
+        'end_timeframe': args.end_timeframe,
+        'latitude': str(round(args.latitude + location_index * 0.05, 5)),
+        'longitude': str(round(args.longitude + location_index * 0.05, 5)),
+        'sample_number': str(args.sample_number),
+        'send_orginal_images': args.send_original_images,
+        'response_format': args.response_format
+    }
+
+
+def parse_server_timing(header: str) -> dict:
+    """Returns {stage: ms} from a Server-Timing header value."""
+    durations = {}
+    for entry in filter(None, (part.strip() for part in header.split(','))):
+        name, _, duration = entry.partition(';dur=')
+        if duration:
+            durations[name] = float(duration)
+    return durations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n', maxsplit=1)[0].strip())
+    parser.add_argument('--url', default='http://localhost:8080')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--locations', type=int, default=1000)
+    parser.add_argument('--latitude', type=float, default=-8.48638)
+    parser.add_argument('--longitude', type=float, default=-55.26209)
+    parser.add_argument('--start-timeframe', default='2020-05-13')
+    parser.add_argument('--end-timeframe', default='2024-05-30')
+    parser.add_argument('--sample-number', type=int, default=2)
+    parser.add_argument('--send-original-images', default='False')
+    parser.add_argument('--response-format', default='msgpack', choices=['json', 'msgpack'])
+    parser.add_argument('--timeout', type=float, default=120)
+    args = parser.parse_args()
+
+    latencies, errors = [], []
+    stage_totals = defaultdict(float)
+    received_bytes = 0
+    lock = threading.Lock()
+    local = threading.local()
+
+    def run_request(request_index: int) -> None:
+        nonlocal received_bytes
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        start_time = time.perf_counter()
+        try:
+            response = local.session.get(
+                f"{args.url.rstrip('/')}/get_satellite_images",
+                params=request_params(request_index, args),
+                timeout=args.timeout
+            )
+            response.raise_for_status()
+        except requests.RequestException as error:
+            with lock:
+                errors.append(str(error))
+            return
+        latency = time.perf_counter() - start_time
+        with lock:
+            latencies.append(latency)
+            received_bytes += len(response.content)
+            for stage, ms in parse_server_timing(response.headers.get('server-timing', '')).items():
+                stage_totals[stage] += ms
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        list(executor.map(run_request, range(args.requests)))
+    wall_time = time.perf_counter() - start_time
+
+    print(f"requests      {args.requests} at concurrency {args.concurrency}, {len(errors)} failed")
+    print(f"throughput    {len(latencies) / wall_time:.2f} requests/s over {wall_time:.1f} s")
+    if latencies:
+        p50, p95, p99 = np.percentile(np.array(latencies) * 1000, [50, 95, 99])
+        print(f"latency       p50 {p50:.0f} ms   p95 {p95:.0f} ms   p99 {p99:.0f} ms   max {max(latencies) * 1000:.0f} ms")
+        print(f"payload       {received_bytes / len(latencies) / 1024:.1f} KiB/response")
+        for stage, total_ms in sorted(stage_totals.items(), key=lambda item: -item[1]):
+            print(f"  {stage:<16} {total_ms / len(latencies):>9.1f} ms/request")
+    for error in sorted(set(errors))[:5]:
+        print(f"error         {error}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,56 @@
 import os
 import io
 import base64
+import json
+import time
+import asyncio
+import threading
 import datetime as dt
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Tuple
 import numpy as np
-from fastapi import FastAPI
-from fastapi.responses import JSONResponse
-from tensorflow.keras.models import load_model
-from backend.custom_layer import RepeatElements
-from backend.segmenter import segment
-from backend.image_array_loader import load_images_from_satellite
+from pydantic import BaseModel
+from fastapi import FastAPI, HTTPException, Header, Request
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+from backend.model_registry import (
+    registry,
+    DEFAULT_MODEL_NAME,
+    DEFAULT_MODEL_VERSION
+)
+from backend.encoding import to_msgpack, MSGPACK_MEDIA_TYPE
+from backend.pipeline import segment_requests, run_download
+from backend.inference_scheduler import inference_scheduler
+from backend.result_cache import result_cache_key
+from backend.segmenter import threshold_probabilities
+from backend.metrics import calculate_metrics, forest_coverage
+from backend.jobs import JobQueue
+from backend.tiling import segment_tiled
+from backend.image_array_loader import (
+    find_available_tiles,
+    build_download_requests,
+    download_images
+)
+from backend.sentinelhub_requester import (
+    side_length_to_image_size,
+    create_bounding_box
+)
+from backend.vectorization import masks_to_geojson
+from backend.instrumentation import (
+    REQUEST_SECONDS,
+    REQUESTS_IN_FLIGHT,
+    STARTUP_SECONDS,
+    stage_timer,
+    record_bytes,
+    start_request_timings,
+    server_timing_header
+)
+
+INFERENCE_BATCH_SIZE = int(os.getenv('INFERENCE_BATCH_SIZE', '8'))
+SEGMENTATION_THRESHOLD = 0.7
+TILE_OVERLAP_PX = int(os.getenv('TILE_OVERLAP_PX', '64'))
+
 
 def numpy_to_base64(img_array):
     img_bytes = io.BytesIO()
@@ -17,89 +59,662 @@ def numpy_to_base64(img_array):
     img_b64 = base64.b64encode(img_bytes.read()).decode('utf-8')
     return img_b64
 
-app = FastAPI()
+
+def create_date_list(start_timeframe: str, end_timeframe: str, sample_number: int):
+    """Returns sample_number dates evenly spaced between start and end date."""
+    start_dt = dt.datetime.strptime(start_timeframe, "%Y-%m-%d")
+    end_dt = dt.datetime.strptime(end_timeframe, "%Y-%m-%d")
+    date_step_size = (end_dt - start_dt)/(sample_number - 1)
+    date_list = [
+        dt.date.strftime(start_dt + i * date_step_size, "%Y-%m-%d")
+        for i in range(sample_number)
+    ]
+    return date_list
+
+
+def scale_model_input(img_at_date):
+    """Normalizes the B08 band of a true color and B08 array to values between
+    0 and 1 and returns the model input."""
+    band_4_at_date = img_at_date[:,:,3]
+    vis_at_date = img_at_date[:,:,:3]
+    max_value = np.max(band_4_at_date)
+    band_4_at_date = band_4_at_date / max_value
+    return np.dstack((vis_at_date, band_4_at_date))
+
+
+def rescale_original(img_at_date):
+    """Returns the true color channels as a uint8 image."""
+    return (img_at_date[:,:,:3] * 255).astype(np.uint8)
+
+
+def preprocess_image(img_at_date):
+    """Splits the true color channels from the B08 band of one date and
+    normalizes the B08 band to values between 0 and 1. Returns the rescaled
+    original image and the model input."""
+    return rescale_original(img_at_date), scale_model_input(img_at_date)
+
+
+def parse_known_dates(known_dates: str) -> List[str]:
+    """Splits a comma separated list of already loaded dates."""
+    return [date.strip() for date in known_dates.split(',') if date.strip()]
+
+
+def parse_threshold(threshold: str) -> float:
+    """Parses a segmentation threshold. Raises a 400 error unless it is a
+    number between 0 and 1."""
+    try:
+        threshold_value = float(threshold)
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error)) from error
+    if not 0 <= threshold_value <= 1:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Threshold {threshold} must be between 0 and 1."
+        )
+    return threshold_value
+
+
+def wants_binary(accept: str | None, response_format: str) -> bool:
+    """Negotiates the msgpack format via query parameter or Accept header."""
+    return response_format == 'msgpack' or MSGPACK_MEDIA_TYPE in (accept or '')
+
+
+def create_images_response(
+        response_content: dict,
+        segmented_img_arrays,
+        original_img_arrays=None,
+        binary: bool = False,
+        probability_img_arrays=None
+    ) -> Response:
+    """Adds the segmented and optionally the original images and quantized
+    probability maps to the response content. Returns them as base64 encoded
+    arrays in JSON, or as msgpack with bit-packed masks and PNG-compressed
+    original images and probability maps if binary is True."""
+    with stage_timer('encode'):
+        response = _encode_images_response(
+            response_content,
+            segmented_img_arrays,
+            original_img_arrays,
+            binary,
+            probability_img_arrays
+        )
+    record_bytes('encode', len(response.body))
+    return response
+
+
+def _encode_images_response(
+        response_content: dict,
+        segmented_img_arrays,
+        original_img_arrays,
+        binary: bool,
+        probability_img_arrays
+    ) -> Response:
+    response_content = dict(response_content, segmented_img_list=segmented_img_arrays)
+    if original_img_arrays is not None:
+        response_content["original_img_list"] = original_img_arrays
+    if probability_img_arrays is not None:
+        response_content["probability_img_list"] = probability_img_arrays
+    if binary:
+        return Response(
+            content=to_msgpack(
+                response_content,
+                mask_keys=("segmented_img_list",),
+                image_keys=("original_img_list", "probability_img_list")
+            ),
+            media_type=MSGPACK_MEDIA_TYPE
+        )
+    for key in ("segmented_img_list", "original_img_list", "probability_img_list"):
+        if key in response_content:
+            response_content[key] = [
+                numpy_to_base64(img)
+                for img in response_content[key]
+            ]
+    return JSONResponse(content=response_content)
+
+
+def resolve_model_version(model_name: str, model_version: str) -> str:
+    try:
+        return registry.resolve_version(model_name, model_version)
+    except KeyError as error:
+        raise HTTPException(status_code=404, detail=str(error)) from error
+
+async def search_location(
+        latitude: float,
+        longitude: float,
+        date_list: List[str],
+        model_name: str,
+        model_version: str,
+        return_originals: bool = True,
+        return_probabilities: bool = False,
+        threshold: float = SEGMENTATION_THRESHOLD,
+        known_dates: List[str] = ()
+    ) -> Tuple[List[str], AsyncIterator, List[str]]:
+    """Searches the optimal tiles for the requested dates. Returns the dates
+    that will be loaded, the (not yet started) pipeline which yields
+    (index, original image, segmented image, probability map) per loaded date
+    and the dates whose optimal tile is one of the known_dates the client
+    already has; those are neither downloaded nor segmented. Masks and
+    probability maps of scenes segmented before are served from the result
+    caches."""
+    config, box, available_tiles = await run_download(
+        find_available_tiles, float(latitude), float(longitude), date_list
+    )
+    reused_dates = [
+        tile.get('date') for tile in available_tiles
+        if tile.get('date') in known_dates
+    ]
+    available_tiles = [
+        tile for tile in available_tiles
+        if tile.get('date') not in known_dates
+    ]
+    loaded_dates = [tile.get('date') for tile in available_tiles]
+    list_of_requests = build_download_requests(config, box, loaded_dates)
+    model = await asyncio.to_thread(registry.get, model_name, model_version)
+    model_fingerprint = await asyncio.to_thread(
+        registry.model_fingerprint, model_name, model_version
+    )
+    cache_keys = [
+        (
+            result_cache_key(box, tile, model_fingerprint, threshold),
+            result_cache_key(box, tile, model_fingerprint)
+        )
+        for tile in available_tiles
+    ]
+    results = segment_requests(
+        config,
+        list_of_requests,
+        preprocess_image,
+        model,
+        threshold=threshold,
+        batch_size=INFERENCE_BATCH_SIZE,
+        cache_keys=cache_keys,
+        return_originals=return_originals,
+        return_probabilities=return_probabilities
+    )
+    return loaded_dates, results, reused_dates
+
+
+def analyse_location(
+        latitude: float,
+        longitude: float,
+        start_timeframe: str,
+        end_timeframe: str,
+        sample_number: int,
+        model_name: str = DEFAULT_MODEL_NAME,
+        model_version: str = DEFAULT_MODEL_VERSION
+    ) -> dict:
+    """Blocking equivalent of get_satellite_images used by the batch jobs.
+    Returns the response content with base64 encoded segmented images."""
+    model_version = registry.resolve_version(model_name, model_version)
+    date_list = create_date_list(start_timeframe, end_timeframe, int(sample_number))
+
+    async def collect_results():
+        loaded_dates, results, _ = await search_location(
+            latitude, longitude, date_list, model_name, model_version,
+            return_originals=False
+        )
+        return loaded_dates, [segmented_img async for _, _, segmented_img, _ in results]
+
+    loaded_dates, segmented_img_arrays = asyncio.run(collect_results())
+    return {
+        "date_list_loaded": loaded_dates,
+        "model_version": model_version,
+        "segmented_img_list": [numpy_to_base64(img) for img in segmented_img_arrays]
+    }
+
+
+class JobItem(BaseModel):
+    latitude: float
+    longitude: float
+    start_timeframe: str = "2020-05-13"
+    end_timeframe: str = "2024-05-30"
+    sample_number: int = 2
+
+
+class JobRequest(BaseModel):
+    items: List[JobItem]
+    model_name: str = DEFAULT_MODEL_NAME
+    model_version: str = DEFAULT_MODEL_VERSION
+
+
+job_queue = JobQueue(process_item=analyse_location)
+models_ready = threading.Event()
+
+def warm_up_models() -> None:
+    """Loads every model and traces it on a dummy batch, then marks the
+    server as ready. Runs next to the server, so liveness checks and the
+    index route answer while TensorFlow is still loading."""
+    start_time = time.perf_counter()
+    try:
+        registry.load_all()
+        STARTUP_SECONDS.labels('load_model').set(time.perf_counter() - start_time)
+        warmup_start_time = time.perf_counter()
+        registry.warm_up()
+        STARTUP_SECONDS.labels('warmup').set(time.perf_counter() - warmup_start_time)
+    except Exception as error:
+        print(f"Model warmup failed: {error}")
+        return
+    STARTUP_SECONDS.labels('total').set(time.perf_counter() - start_time)
+    models_ready.set()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    threading.Thread(target=warm_up_models, daemon=True).start()
+    job_queue.resume()
+    yield
+
+class StreamAwareGZipMiddleware:
+    """GZipMiddleware for every path but streaming_paths. The gzip responder
+    holds streamed chunks back until the response ends, which would undo
+    the point of streaming."""
+
+    def __init__(self, app, streaming_paths=(), **gzip_options):
+        self.app = app
+        self.gzip_app = GZipMiddleware(app, **gzip_options)
+        self.streaming_paths = set(streaming_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['path'] in self.streaming_paths:
+            await self.app(scope, receive, send)
+        else:
+            await self.gzip_app(scope, receive, send)
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(
+    StreamAwareGZipMiddleware,
+    streaming_paths=('/stream_satellite_images',),
+    minimum_size=1000
+)
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Counts in-flight requests, observes the request latency per endpoint
+    and reports the time spent per stage in the Server-Timing header."""
+    timings = start_request_timings()
+    start_time = time.perf_counter()
+    REQUESTS_IN_FLIGHT.inc()
+    try:
+        response = await call_next(request)
+    finally:
+        REQUESTS_IN_FLIGHT.dec()
+    endpoint = request.scope.get('endpoint')
+    REQUEST_SECONDS.labels(getattr(endpoint, '__name__', 'unmatched')).observe(
+        time.perf_counter() - start_time
+    )
+    if timings:
+        response.headers['Server-Timing'] = server_timing_header(timings)
+    return response
 
 @app.get('/')
 def index():
     return {'api status': "running"}
 
+@app.get('/healthz')
+def healthz():
+    """Liveness probe, answers as soon as the server runs."""
+    return {'status': "alive"}
+
+@app.get('/readyz')
+def readyz():
+    """Readiness probe, answers 503 until the models are loaded and warmed up."""
+    if not models_ready.is_set():
+        raise HTTPException(status_code=503, detail="Models are warming up.")
+    return {'status': "ready"}
+
 @app.get("/get_satellite_images")
-def get_satellite_images(
+async def get_satellite_images(
     start_timeframe: str = "2020-05-13",
     end_timeframe: str = "2024-05-30",
     longitude: str = "-55.26209",
     latitude: str = "-8.48638",
     sample_number: str = "2",
-    send_orginal_images = 'False'
+    send_orginal_images = 'False',
+    model_name: str = DEFAULT_MODEL_NAME,
+    model_version: str = DEFAULT_MODEL_VERSION,
+    response_format: str = 'json',
+    return_probabilities: str = 'False',
+    known_dates: str = '',
+    return_geojson: str = 'False',
+    accept: str | None = Header(default=None)
     ):
     """Takes start and end date and coordinates and returns
     a JSON response object including dates, segmented images and optionally,
     original images. If sample_number equals two, only data belonging to the
     closest point in time to the start and the end date respectively will be
     returned, higher sample_numbers will return data from points in time between
-    the start and the end date, as evenly spaced as possible.
+    the start and the end date, as evenly spaced as possible. model_name and
+    model_version select the segmentation model from the registry. Setting
+    response_format to 'msgpack' or accepting application/x-msgpack returns
+    bit-packed masks and PNG-compressed original images instead of JSON.
+    Setting return_probabilities to 'True' adds the model's forest
+    probabilities quantized to uint8 (0-255), so clients can apply their own
+    threshold without another request. known_dates takes the comma separated
+    dates the client already has; requested dates resolving to one of them are
+    listed in date_list_known instead of being loaded again. Setting
+    return_geojson to 'True' adds the forest of every date and the forest lost
+    between the first and last date as simplified GeoJSON polygons.
     """
-    start_dt = dt.datetime.strptime(start_timeframe, "%Y-%m-%d")
-    end_dt = dt.datetime.strptime(end_timeframe, "%Y-%m-%d")
-    date_step_size = (end_dt - start_dt)/(int(sample_number) - 1)
-    date_list = [
-        dt.date.strftime(start_dt + i * date_step_size, "%Y-%m-%d")
-        for i in range(int(sample_number))
+    model_version = await asyncio.to_thread(resolve_model_version, model_name, model_version)
+    date_list = create_date_list(start_timeframe, end_timeframe, int(sample_number))
+    loaded_dates, results, reused_dates = await search_location(
+        latitude, longitude, date_list, model_name, model_version,
+        return_originals=send_orginal_images == 'True',
+        return_probabilities=return_probabilities == 'True',
+        known_dates=parse_known_dates(known_dates)
+    )
+    original_img_arrays = []
+    segmented_img_arrays = []
+    probability_img_arrays = []
+    async for _, original_img, segmented_img, probability_img in results:
+        original_img_arrays.append(original_img)
+        segmented_img_arrays.append(segmented_img)
+        probability_img_arrays.append(probability_img)
+
+    response_content = {
+        "date_list_loaded": loaded_dates,
+        "date_list_known": reused_dates,
+        "model_version": model_version
+    }
+    if return_geojson == 'True':
+        response_content["geojson"] = await asyncio.to_thread(
+            masks_to_geojson,
+            loaded_dates,
+            segmented_img_arrays,
+            create_bounding_box(float(latitude), float(longitude))
+        )
+    return await asyncio.to_thread(
+        create_images_response,
+        response_content,
+        segmented_img_arrays,
+        original_img_arrays if send_orginal_images == 'True' else None,
+        binary=wants_binary(accept, response_format),
+        probability_img_arrays=probability_img_arrays if return_probabilities == 'True' else None
+    )
+
+@app.get("/rethreshold")
+async def rethreshold(
+    start_timeframe: str = "2020-05-13",
+    end_timeframe: str = "2024-05-30",
+    longitude: str = "-55.26209",
+    latitude: str = "-8.48638",
+    sample_number: str = "2",
+    threshold: str = "0.7",
+    model_name: str = DEFAULT_MODEL_NAME,
+    model_version: str = DEFAULT_MODEL_VERSION,
+    response_format: str = 'json',
+    accept: str | None = Header(default=None)
+    ):
+    """Works like get_satellite_images but segments with a custom threshold.
+    Masks are derived from the cached probability maps, so scenes segmented
+    before are re-thresholded without downloading or running the model again.
+    """
+    threshold_value = parse_threshold(threshold)
+    model_version = await asyncio.to_thread(resolve_model_version, model_name, model_version)
+    date_list = create_date_list(start_timeframe, end_timeframe, int(sample_number))
+    loaded_dates, results, _ = await search_location(
+        latitude, longitude, date_list, model_name, model_version,
+        return_originals=False,
+        return_probabilities=True
+    )
+    segmented_img_arrays = [
+        threshold_probabilities(probability_img, threshold_value)
+        async for _, _, _, probability_img in results
     ]
+    return await asyncio.to_thread(
+        create_images_response,
+        {
+            "date_list_loaded": loaded_dates,
+            "model_version": model_version,
+            "threshold": threshold_value
+        },
+        segmented_img_arrays,
+        binary=wants_binary(accept, response_format)
+    )
+
+@app.get("/threshold_sweep")
+async def threshold_sweep(
+    start_timeframe: str = "2020-05-13",
+    end_timeframe: str = "2024-05-30",
+    longitude: str = "-55.26209",
+    latitude: str = "-8.48638",
+    sample_number: str = "2",
+    thresholds: str = "0.3,0.4,0.5,0.6,0.7,0.8,0.9",
+    model_name: str = DEFAULT_MODEL_NAME,
+    model_version: str = DEFAULT_MODEL_VERSION
+    ):
+    """Returns the forest coverage in percent per loaded date for each of the
+    comma separated thresholds, computed from the (cached) probability maps."""
+    threshold_list = [parse_threshold(threshold) for threshold in thresholds.split(',')]
+    model_version = await asyncio.to_thread(resolve_model_version, model_name, model_version)
+    date_list = create_date_list(start_timeframe, end_timeframe, int(sample_number))
+    loaded_dates, results, _ = await search_location(
+        latitude, longitude, date_list, model_name, model_version,
+        return_originals=False,
+        return_probabilities=True
+    )
+    quantized_thresholds = np.array(threshold_list) * 255
+    coverage = []
+    async for _, _, _, probability_img in results:
+        # One histogram per date answers every threshold at once.
+        histogram = np.bincount(probability_img.ravel(), minlength=256)
+        pixels_above = np.cumsum(histogram[::-1])[::-1]
+        first_level_above = np.floor(quantized_thresholds).astype(int) + 1
+        coverage.append([
+            float(pixels_above[level] / probability_img.size * 100) if level < 256 else 0.0
+            for level in first_level_above
+        ])
+    return {
+        "date_list_loaded": loaded_dates,
+        "model_version": model_version,
+        "thresholds": threshold_list,
+        "forest_coverage_percent": coverage
+    }
 
-    loaded_dates, img_arrays = load_images_from_satellite(
+@app.get("/get_area_segmentation")
+def get_area_segmentation(
+    start_timeframe: str = "2020-05-13",
+    end_timeframe: str = "2024-05-30",
+    longitude: str = "-55.26209",
+    latitude: str = "-8.48638",
+    sample_number: str = "2",
+    area_km2: str = "100",
+    send_orginal_images = 'False',
+    model_name: str = DEFAULT_MODEL_NAME,
+    model_version: str = DEFAULT_MODEL_VERSION,
+    response_format: str = 'json',
+    accept: str | None = Header(default=None)
+    ):
+    """Works like get_satellite_images but for a square area of interest of
+    area_km2 square kilometers around the coordinates. The scene is downloaded
+    in one piece, segmented in overlapping 512 px windows and blended back into
+    one mosaic mask per date. Every window is normalized like a 512 px tile of
+    get_satellite_images. Dates are processed one after the other, so only
+    one scene is held at a time besides the results.
+    """
+    model_version = resolve_model_version(model_name, model_version)
+    try:
+        image_size_px = side_length_to_image_size(np.sqrt(float(area_km2)))
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error)) from error
+    date_list = create_date_list(start_timeframe, end_timeframe, int(sample_number))
+
+    config, box, available_tiles = find_available_tiles(
         lat_deg=float(latitude),
         lon_deg=float(longitude),
-        date_list=date_list
+        date_list=date_list,
+        image_size_px=image_size_px
+    )
+    loaded_dates = [tile.get('date') for tile in available_tiles]
+    list_of_requests = build_download_requests(
+        config, box, loaded_dates, image_size_px=image_size_px
     )
 
-    number_of_dates = len(loaded_dates)
-    original_img_arrays = []
-    combined_img_arrays = []
-    # Join 3- with 4-band, normalize 4-band channel to values between 0 and 1
-    for date in range(number_of_dates):
-        band_4_at_date = img_arrays[(date + number_of_dates)][:,:,3]
-        vis_at_date = img_arrays[date]
-        rescaled_vis_at_date = (vis_at_date * 255).astype(np.uint8)
-        original_img_arrays.append(rescaled_vis_at_date)
-        max_value = np.max(band_4_at_date)
-        band_4_at_date = band_4_at_date / max_value
-        combined_img_arrays.append(np.dstack((vis_at_date, band_4_at_date)))
-
-    model = load_model(
-        filepath='./backend/model_ressources/att_unet_4b.hdf5',
-        custom_objects={'RepeatElements': RepeatElements}
+    model = registry.get(model_name, model_version)
+    segmented_img_arrays, original_img_arrays = [], []
+    for request in list_of_requests:
+        img_at_date = download_images(config, [request])[0]
+        segmented_img_arrays.append(segment_tiled(
+            img_at_date,
+            model,
+            threshold=SEGMENTATION_THRESHOLD,
+            overlap=TILE_OVERLAP_PX,
+            batch_size=INFERENCE_BATCH_SIZE,
+            scale_window=scale_model_input
+        ))
+        if send_orginal_images == 'True':
+            original_img_arrays.append(rescale_original(img_at_date))
+        del img_at_date
+
+    return create_images_response(
+        {
+            "date_list_loaded": loaded_dates,
+            "model_version": model_version,
+            "image_size_px": image_size_px
+        },
+        segmented_img_arrays,
+        original_img_arrays if send_orginal_images == 'True' else None,
+        binary=wants_binary(accept, response_format)
     )
-    segmented_img_arrays = [
-        segment(img_at_date, model, threshold=0.7)
-        for img_at_date in combined_img_arrays
+
+@app.get("/get_site_metrics")
+async def get_site_metrics(
+    start_timeframe: str = "2020-05-13",
+    end_timeframe: str = "2024-05-30",
+    longitude: str = "-55.26209",
+    latitude: str = "-8.48638",
+    sample_number: str = "2",
+    model_name: str = DEFAULT_MODEL_NAME,
+    model_version: str = DEFAULT_MODEL_VERSION
+    ):
+    """Works like get_satellite_images but returns no images. The forest
+    coverage of every date is computed right after its segmentation and only
+    the metrics table (coverage, changes in percent, percentage points and
+    hectares, monthly change rate) is returned, one list per column.
+    """
+    model_version = await asyncio.to_thread(resolve_model_version, model_name, model_version)
+    date_list = create_date_list(start_timeframe, end_timeframe, int(sample_number))
+    loaded_dates, results, _ = await search_location(
+        latitude, longitude, date_list, model_name, model_version,
+        return_originals=False
+    )
+    coverages = [
+        forest_coverage(segmented_img)
+        async for _, _, segmented_img, _ in results
     ]
+    return {
+        "date_list_loaded": loaded_dates,
+        "model_version": model_version,
+        "metrics": calculate_metrics(loaded_dates, coverages)
+    }
 
-    for i, arr in enumerate(segmented_img_arrays):
-        if arr.shape != (512, 512):
-            loaded_dates.pop(i)
-            original_img_arrays.pop(i)
-            segmented_img_arrays.pop(i)
+@app.get("/stream_satellite_images")
+async def stream_satellite_images(
+    start_timeframe: str = "2020-05-13",
+    end_timeframe: str = "2024-05-30",
+    longitude: str = "-55.26209",
+    latitude: str = "-8.48638",
+    sample_number: str = "2",
+    send_orginal_images = 'False',
+    model_name: str = DEFAULT_MODEL_NAME,
+    model_version: str = DEFAULT_MODEL_VERSION,
+    known_dates: str = ''
+    ):
+    """Streaming variant of get_satellite_images. Returns newline delimited
+    JSON: a first line with the dates that will be loaded and the known_dates
+    that are reused, followed by one line per loaded date with its base64
+    encoded segmented and optionally original image, emitted as soon as that
+    date is segmented. If processing fails midway, a last line with an
+    'error' key is emitted instead of the remaining dates.
+    """
+    model_version = await asyncio.to_thread(resolve_model_version, model_name, model_version)
+    date_list = create_date_list(start_timeframe, end_timeframe, int(sample_number))
+    loaded_dates, results, reused_dates = await search_location(
+        latitude, longitude, date_list, model_name, model_version,
+        return_originals=send_orginal_images == 'True',
+        known_dates=parse_known_dates(known_dates)
+    )
 
-    segmented_img_b64_list = [
-        numpy_to_base64(img)
-        for img in segmented_img_arrays
-    ]
-    original_img_b64_list = [
-        numpy_to_base64(img)
-        for img in original_img_arrays
-    ]
+    async def generate_lines():
+        yield json.dumps({
+            "date_list_loaded": loaded_dates,
+            "date_list_known": reused_dates,
+            "model_version": model_version
+        }) + "\n"
+        try:
+            async for index, original_img, segmented_img, _ in results:
+                with stage_timer('encode'):
+                    line_content = {
+                        "date": loaded_dates[index],
+                        "segmented_img": numpy_to_base64(segmented_img)
+                    }
+                    if send_orginal_images == 'True':
+                        line_content["original_img"] = numpy_to_base64(original_img)
+                    line = json.dumps(line_content) + "\n"
+                record_bytes('encode', len(line))
+                yield line
+        except Exception as error:
+            # The status line is already sent, report the failure in-band.
+            print(f"Streaming failed: {error!r}")
+            yield json.dumps({"error": str(error)}) + "\n"
+
+    return StreamingResponse(generate_lines(), media_type="application/x-ndjson")
+
+@app.post("/jobs")
+def submit_job(job_request: JobRequest):
+    """Queues a batch analysis of many locations and returns its job id.
+    Identical items are only analysed once."""
+    model_version = resolve_model_version(job_request.model_name, job_request.model_version)
+    job_id = job_queue.submit(
+        items=[item.model_dump() for item in job_request.items],
+        options={"model_name": job_request.model_name, "model_version": model_version}
+    )
+    return {"job_id": job_id}
+
+@app.get("/jobs/{job_id}")
+def get_job_status(job_id: str):
+    """Returns the number of queued, running, done and failed items of a job."""
+    status = job_queue.status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job '{job_id}'.")
+    return status
+
+@app.get("/jobs/{job_id}/results")
+def get_job_results(job_id: str):
+    """Returns every item of a job with its status and, once done, its result
+    in the get_satellite_images format."""
+    results = job_queue.results(job_id)
+    if results is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job '{job_id}'.")
+    return JSONResponse(content=results)
+
+@app.get("/inference_scheduler")
+def get_inference_scheduler_stats():
+    """Returns queue depth, batching parameters and batch size statistics of
+    the inference scheduler."""
+    return inference_scheduler.stats()
+
+@app.post("/inference_scheduler")
+def tune_inference_scheduler(
+    max_batch_size: int | None = None,
+    max_wait_ms: float | None = None
+    ):
+    """Adjusts the maximum batch size and maximum wait time of the inference
+    scheduler at runtime."""
+    if max_batch_size is not None:
+        if max_batch_size < 1:
+            raise HTTPException(status_code=400, detail="max_batch_size must be positive.")
+        inference_scheduler.max_batch_size = max_batch_size
+    if max_wait_ms is not None:
+        if max_wait_ms < 0:
+            raise HTTPException(status_code=400, detail="max_wait_ms must not be negative.")
+        inference_scheduler.max_wait_ms = max_wait_ms
+    return inference_scheduler.stats()
 
-    if send_orginal_images == 'False':
-        json_response_content = {
-                "date_list_loaded": loaded_dates,
-                "segmented_img_list": segmented_img_b64_list}
-    elif send_orginal_images == 'True':
-        json_response_content = {
-                "date_list_loaded": loaded_dates,
-                "segmented_img_list": segmented_img_b64_list,
-                "original_img_list": original_img_b64_list}
-    return JSONResponse(content=json_response_content)
+@app.get("/metrics")
+def get_prometheus_metrics():
+    """Exposes stage timings and bytes, cache hit and miss counts, request
+    latencies and in-flight requests in the Prometheus text format."""
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
 if __name__ == "__main__":
     import uvicorn
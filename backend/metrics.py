@@ -0,0 +1,63 @@
+from typing import Dict, List
+import numpy as np
+
+
+HECTAR_PER_PIXEL = 0.01
+DAYS_PER_MONTH = 30.437
+METRIC_COLUMNS = (
+    "coverage",
+    "cover_diff_rel",
+    "cover_diff_pp",
+    "cover_diff_pp_cum",
+    "cover_diff_ha",
+    "cover_diff_ha_cum",
+    "days_since_prev",
+    "months_since_prev",
+    "loss_per_months_ha"
+)
+
+
+def forest_coverage(segmented_img_array: np.ndarray) -> float:
+    """Returns the share of forest pixels of a black and white mask in percent."""
+    return np.count_nonzero(segmented_img_array) / segmented_img_array.size * 100
+
+
+def calculate_metrics(
+        dates: List[str],
+        coverages: List[float],
+        image_size_px: int = 512
+    ) -> Dict[str, list]:
+    """
+    Server-side counterpart of the frontend's calculate_metrics. Takes the
+    loaded dates and their forest coverage in percent and returns a columnar
+    table with the coverage changes against the previous date, in percent,
+    percentage points and hectares, and the monthly change rate. Columns of
+    the first date are 0, like in the frontend.
+    """
+    hectar_per_image = image_size_px ** 2 * HECTAR_PER_PIXEL
+    coverage = np.asarray(coverages, dtype=np.float64)
+    day_numbers = np.asarray(dates, dtype='datetime64[D]').astype(np.int64)
+    prev_coverage = np.concatenate(([np.nan], coverage[:-1]))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cover_diff_pp = coverage - prev_coverage
+        cover_diff_rel = cover_diff_pp / prev_coverage * 100
+        cover_diff_ha = cover_diff_pp / 100 * hectar_per_image
+        days_since_prev = np.concatenate(([np.nan], np.diff(day_numbers)))
+        months_since_prev = days_since_prev / DAYS_PER_MONTH
+        loss_per_months_ha = cover_diff_ha / months_since_prev
+    columns = {
+        "coverage": coverage,
+        "cover_diff_rel": cover_diff_rel,
+        "cover_diff_pp": cover_diff_pp,
+        "cover_diff_pp_cum": np.nancumsum(cover_diff_pp),
+        "cover_diff_ha": cover_diff_ha,
+        "cover_diff_ha_cum": np.nancumsum(cover_diff_ha),
+        "days_since_prev": days_since_prev,
+        "months_since_prev": months_since_prev,
+        "loss_per_months_ha": loss_per_months_ha
+    }
+    table = {"date": [date[:7].replace('-', '/') for date in dates]}
+    for name in METRIC_COLUMNS:
+        values = np.nan_to_num(columns[name], nan=0.0, posinf=0.0, neginf=0.0)
+        table[name] = [round(float(value), 4) for value in values]
+    return table
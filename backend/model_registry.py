@@ -0,0 +1,179 @@
+import os
+import re
+import time
+import threading
+from typing import Dict, List, Tuple
+import numpy as np
+from backend.inference_backends import (
+    INPUT_SHAPE,
+    create_backend,
+    calibration_data_from_directory
+)
+from backend.instrumentation import stage_timer
+
+
+MODEL_DIRECTORY = './backend/model_ressources'
+DEFAULT_MODEL_NAME = 'att_unet_4b'
+DEFAULT_MODEL_VERSION = 'latest'
+INFERENCE_BACKEND = os.getenv('INFERENCE_BACKEND', 'keras')
+MODEL_RESCAN_INTERVAL_S = float(os.getenv('MODEL_RESCAN_INTERVAL_S', '60'))
+# Scaled sample tiles saved with np.save, required by the tflite-int8 backend.
+TFLITE_CALIBRATION_DIR = os.getenv('TFLITE_CALIBRATION_DIR', './backend/calibration_tiles')
+WEIGHTS_FILE_PATTERN = re.compile(r'^(?P<name>.+?)(?:_v(?P<version>[\w.-]+))?\.hdf5$')
+
+
+def _version_sort_key(version: str):
+    """Sorts numeric versions numerically and places them after named ones."""
+    return (version.isdigit(), int(version) if version.isdigit() else version)
+
+
+class ModelRegistry:
+    """
+    Process-wide store of loaded segmentation models, served by name and
+    version. Weight files are discovered in the model directory as
+    '<name>.hdf5' (version '1') or '<name>_v<version>.hdf5'. A model is
+    reloaded as soon as its weights file changes on disk, so new weights can
+    be swapped in without restarting the server. Models are served wrapped in
+    the configured inference backend (see inference_backends).
+
+    The directory is rescanned when a lookup misses or at most every
+    rescan_interval_s seconds. Models are loaded outside the registry lock,
+    one load per model at a time, so lookups never wait for TensorFlow.
+    """
+
+    def __init__(
+            self,
+            model_directory: str = MODEL_DIRECTORY,
+            inference_backend: str = INFERENCE_BACKEND,
+            rescan_interval_s: float = MODEL_RESCAN_INTERVAL_S
+        ):
+        self.model_directory = model_directory
+        self.inference_backend = inference_backend
+        self.rescan_interval_s = rescan_interval_s
+        self._files: Dict[Tuple[str, str], str] = {}
+        self._models: Dict[Tuple[str, str, str], Tuple[float, object]] = {}
+        self._load_locks: Dict[Tuple[str, str, str], threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._last_refresh = 0.0
+        self.refresh()
+
+    def refresh(self) -> None:
+        """Rescans the model directory for weight files."""
+        files = {}
+        if os.path.isdir(self.model_directory):
+            for file_name in os.listdir(self.model_directory):
+                match = WEIGHTS_FILE_PATTERN.match(file_name)
+                if match:
+                    key = (match.group('name'), match.group('version') or '1')
+                    files[key] = os.path.join(self.model_directory, file_name)
+        with self._lock:
+            self._files = files
+            self._last_refresh = time.monotonic()
+            for key in list(self._models):
+                if key[:2] not in files:
+                    del self._models[key]
+
+    def versions(self, name: str) -> List[str]:
+        """Returns the available versions of a model, oldest first."""
+        return sorted(
+            [version for model_name, version in self._files if model_name == name],
+            key=_version_sort_key
+        )
+
+    def _find_version(self, name: str, version: str):
+        if version == 'latest':
+            available_versions = self.versions(name)
+            return available_versions[-1] if available_versions else None
+        return version if (name, version) in self._files else None
+
+    def resolve_version(self, name: str, version: str = DEFAULT_MODEL_VERSION) -> str:
+        """Translates 'latest' into a concrete version, raises KeyError if unknown."""
+        if time.monotonic() - self._last_refresh > self.rescan_interval_s:
+            self.refresh()
+        resolved_version = self._find_version(name, version)
+        if resolved_version is None:
+            self.refresh()
+            resolved_version = self._find_version(name, version)
+        if resolved_version is None:
+            if version == 'latest':
+                raise KeyError(f"No weights found for model '{name}'.")
+            raise KeyError(f"Model '{name}' has no version '{version}'.")
+        return resolved_version
+
+    def model_fingerprint(self, name: str, version: str, inference_backend: str = None) -> str:
+        """Identifies the weights and inference backend that serve a model
+        version, for keying its results. Changes when the weights file is
+        swapped, even under the same version."""
+        inference_backend = inference_backend or self.inference_backend
+        with self._lock:
+            filepath = self._files.get((name, version))
+        if filepath is None:
+            raise KeyError(f"Model '{name}' has no version '{version}'.")
+        file_stat = os.stat(filepath)
+        return f"{name}:{version}:{file_stat.st_mtime_ns}-{file_stat.st_size}:{inference_backend}"
+
+    def get(
+            self,
+            name: str = DEFAULT_MODEL_NAME,
+            version: str = DEFAULT_MODEL_VERSION,
+            inference_backend: str = None
+        ):
+        """Returns the loaded model wrapped in an inference backend, (re)loading
+        it if its weights file changed."""
+        version = self.resolve_version(name, version)
+        inference_backend = inference_backend or self.inference_backend
+        key = (name, version, inference_backend)
+        with self._lock:
+            filepath = self._files.get((name, version))
+            if filepath is None:
+                raise KeyError(f"Model '{name}' has no version '{version}'.")
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+            loaded = self._models.get(key)
+        modified_time = os.path.getmtime(filepath)
+        if loaded is not None and loaded[0] == modified_time:
+            return loaded[1]
+        with load_lock:
+            with self._lock:
+                loaded = self._models.get(key)
+            if loaded is None or loaded[0] != modified_time:
+                with stage_timer('load_model'):
+                    # TensorFlow is imported on first use, which keeps it off
+                    # the import path of the server and its light routes.
+                    from tensorflow.keras.models import load_model
+                    from backend.custom_layer import RepeatElements
+                    model = load_model(
+                        filepath=filepath,
+                        custom_objects={'RepeatElements': RepeatElements}
+                    )
+                representative_data = None
+                if inference_backend == 'tflite-int8':
+                    representative_data = calibration_data_from_directory(TFLITE_CALIBRATION_DIR)
+                    if representative_data is None:
+                        raise ValueError(
+                            "The tflite-int8 backend needs calibration tiles (.npy) "
+                            f"in TFLITE_CALIBRATION_DIR ({TFLITE_CALIBRATION_DIR})."
+                        )
+                loaded = (
+                    modified_time,
+                    create_backend(model, inference_backend, representative_data=representative_data)
+                )
+                with self._lock:
+                    self._models[key] = loaded
+            return loaded[1]
+
+    def load_all(self) -> None:
+        """Loads every discovered model, meant to be called at startup."""
+        for name, version in list(self._files):
+            self.get(name, version)
+
+    def warm_up(self) -> None:
+        """Runs every loaded model once on a dummy (1, 512, 512, 4) batch, so
+        the prediction graph is traced before the first request."""
+        with self._lock:
+            models = [model for _, model in self._models.values()]
+        for model in models:
+            with stage_timer('warmup'):
+                model.predict(np.zeros((1, *INPUT_SHAPE), dtype=np.float32), verbose=0)
+
+
+registry = ModelRegistry()
@@ -0,0 +1,156 @@
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Callable, List, Optional, Tuple
+import numpy as np
+from sentinelhub import SHConfig
+from sentinelhub.download import DownloadRequest
+from backend.image_array_loader import download_images
+from backend.sentinelhub_requester import SENTINELHUB_POOL_SIZE
+from backend.inference_scheduler import inference_scheduler
+from backend.result_cache import result_cache, probability_cache
+from backend.instrumentation import stage_timer
+
+
+# numpy releases the GIL for the heavy lifting, so threads are enough to keep
+# the event loop free. Inference runs on the shared inference scheduler, which
+# batches work across concurrent requests.
+PREPROCESSING_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix='preprocessing')
+# Sentinel Hub calls mostly wait on the network. They get their own threads,
+# one per pooled connection, instead of competing for the few threads of the
+# default executor with cache, encoding and GeoJSON work.
+DOWNLOAD_EXECUTOR = ThreadPoolExecutor(
+    max_workers=SENTINELHUB_POOL_SIZE,
+    thread_name_prefix='sentinelhub'
+)
+
+
+async def run_download(function, *args):
+    """Runs a blocking Sentinel Hub call on DOWNLOAD_EXECUTOR. The context is
+    copied like asyncio.to_thread does, so stage timings reach the request."""
+    return await asyncio.get_running_loop().run_in_executor(
+        DOWNLOAD_EXECUTOR, contextvars.copy_context().run, function, *args
+    )
+
+
+async def segment_requests(
+        config: SHConfig,
+        list_of_requests: List[DownloadRequest],
+        preprocess: Callable[[np.ndarray], Tuple[np.ndarray, np.ndarray]],
+        model,
+        threshold: float = 0.7,
+        batch_size: int = 8,
+        max_concurrent_downloads: int = 5,
+        cache_keys: Optional[List[Tuple[str, str]]] = None,
+        return_originals: bool = True,
+        return_probabilities: bool = False
+    ) -> AsyncIterator[Tuple[int, Optional[np.ndarray], np.ndarray, Optional[np.ndarray]]]:
+    """
+    Downloads, preprocesses and segments the requests as overlapping stages:
+    date k+1 is downloaded and preprocessed while date k is being segmented.
+    The inference stage submits everything preprocessed so far to the
+    inference scheduler at once.
+    preprocess takes a downloaded array and returns the original image and
+    the model input. cache_keys holds a (mask key, probability map key) pair
+    per request: cached results skip inference, and their download too unless
+    return_originals is set. Yields (request index, original image or None,
+    segmented image, quantized probability map or None) in request order.
+    """
+    loop = asyncio.get_running_loop()
+    download_slots = asyncio.Semaphore(max_concurrent_downloads)
+    preprocessed_queue: asyncio.Queue = asyncio.Queue()
+
+    def lookup_cached_results():
+        return [
+            (
+                result_cache.get(mask_key),
+                probability_cache.get(probability_key) if return_probabilities else None
+            )
+            for mask_key, probability_key in cache_keys
+        ]
+
+    def store_results(index, segmented_img, probability_img):
+        result_cache.put(cache_keys[index][0], segmented_img)
+        probability_cache.put(cache_keys[index][1], probability_img)
+
+    # The caches may read and write a disk tier, so they stay off the event loop.
+    cached_results = (
+        await asyncio.to_thread(lookup_cached_results)
+        if cache_keys is not None
+        else [(None, None)] * len(list_of_requests)
+    )
+    needs_inference = [
+        cached_mask is None or (return_probabilities and cached_probability is None)
+        for cached_mask, cached_probability in cached_results
+    ]
+
+    async def download(request: DownloadRequest) -> np.ndarray:
+        async with download_slots:
+            img_arrays = await run_download(download_images, config, [request])
+        return img_arrays[0]
+
+    async def preprocess_in_order(download_tasks):
+        try:
+            for index, download_task in enumerate(download_tasks):
+                original_img, model_input = None, None
+                if download_task is not None:
+                    img_array = await download_task
+                    with stage_timer('preprocess'):
+                        original_img, model_input = await loop.run_in_executor(
+                            PREPROCESSING_EXECUTOR, preprocess, img_array
+                        )
+                await preprocessed_queue.put((index, original_img, model_input))
+        except Exception as error:
+            # Hand the error to the inference stage, which re-raises it.
+            await preprocessed_queue.put(error)
+        await preprocessed_queue.put(None)
+
+    download_tasks = [
+        asyncio.ensure_future(download(request))
+        if inference_needed or return_originals
+        else None
+        for request, inference_needed in zip(list_of_requests, needs_inference)
+    ]
+    preprocessing_task = asyncio.ensure_future(preprocess_in_order(download_tasks))
+    try:
+        finished = False
+        while not finished:
+            batch = [await preprocessed_queue.get()]
+            while not preprocessed_queue.empty() and len(batch) < batch_size:
+                batch.append(preprocessed_queue.get_nowait())
+            if batch[-1] is None:
+                finished = True
+                batch.pop()
+            for item in batch:
+                if isinstance(item, Exception):
+                    raise item
+            if not batch:
+                continue
+            with stage_timer('inference'):
+                predictions = iter(await asyncio.gather(*[
+                    asyncio.wrap_future(
+                        inference_scheduler.submit(model, model_input, threshold)
+                    )
+                    for index, _, model_input in batch
+                    if needs_inference[index]
+                ]))
+            for index, original_img, _ in batch:
+                segmented_img, probability_img = cached_results[index]
+                if needs_inference[index]:
+                    segmented_img, probability_img = next(predictions)
+                    if cache_keys is not None:
+                        await asyncio.to_thread(
+                            store_results, index, segmented_img, probability_img
+                        )
+                yield (
+                    index,
+                    original_img,
+                    segmented_img,
+                    probability_img if return_probabilities else None
+                )
+        await preprocessing_task
+    finally:
+        preprocessing_task.cancel()
+        for download_task in download_tasks:
+            if download_task is not None:
+                download_task.cancel()
@@ -0,0 +1,139 @@
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+import numpy as np
+from sentinelhub import BBox
+from backend.instrumentation import record_cache_lookup
+
+
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv('RESULT_CACHE_MAX_ENTRIES', '1024'))
+RESULT_CACHE_TTL_SECONDS = float(os.getenv('RESULT_CACHE_TTL_SECONDS', str(7 * 24 * 3600)))
+RESULT_CACHE_DIR = os.getenv('RESULT_CACHE_DIR')
+PROBABILITY_CACHE_MAX_ENTRIES = int(os.getenv('PROBABILITY_CACHE_MAX_ENTRIES', '256'))
+PROBABILITY_CACHE_DIR = os.getenv('PROBABILITY_CACHE_DIR')
+
+
+def result_cache_key(bbox: BBox, tile: dict, model_fingerprint: str, threshold: float = None) -> str:
+    """Returns the cache key of a segmentation result. A tile's id and date
+    identify the scene, so equal areas and scenes share results across
+    requested timeframes. model_fingerprint identifies the weights and
+    inference backend (see ModelRegistry.model_fingerprint). Probability
+    maps are keyed without threshold."""
+    key_content = repr((
+        tuple(round(coordinate, 5) for coordinate in bbox),
+        str(bbox.crs),
+        tile.get('id'),
+        tile.get('date'),
+        model_fingerprint,
+        None if threshold is None else float(threshold)
+    ))
+    return hashlib.sha256(key_content.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """
+    Cache of segmentation masks, stored bit-packed. An in-memory LRU tier holds
+    up to max_entries masks; if a directory is given, masks are also written to
+    a disk tier that survives restarts. Entries expire after ttl_seconds.
+    With bit_packed set to False, uint8 arrays such as quantized probability
+    maps are stored as they are.
+    """
+
+    def __init__(
+            self,
+            max_entries: int = RESULT_CACHE_MAX_ENTRIES,
+            ttl_seconds: float = RESULT_CACHE_TTL_SECONDS,
+            cache_dir: Optional[str] = RESULT_CACHE_DIR,
+            bit_packed: bool = True,
+            name: str = 'result'
+        ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.cache_dir = cache_dir
+        self.bit_packed = bit_packed
+        self.name = name
+        self._entries: "OrderedDict[str, Tuple[float, bytes, Tuple[int, int]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """Returns the cached mask (or uint8 array), or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.time():
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is None:
+            entry = self._load_from_disk(key)
+            if entry is None:
+                record_cache_lookup(self.name, hit=False)
+                return None
+            self._remember(key, entry)
+        record_cache_lookup(self.name, hit=True)
+        _, packed_mask, shape = entry
+        if not self.bit_packed:
+            return np.frombuffer(packed_mask, dtype=np.uint8).reshape(shape)
+        return unpack_mask(packed_mask, shape)
+
+    def put(self, key: str, mask: np.ndarray) -> None:
+        packed_mask = (
+            np.packbits(mask > 0).tobytes()
+            if self.bit_packed
+            else np.ascontiguousarray(mask, dtype=np.uint8).tobytes()
+        )
+        entry = (time.time() + self.ttl_seconds, packed_mask, mask.shape)
+        self._remember(key, entry)
+        if self.cache_dir:
+            path = self._path(key)
+            temporary_path = f'{path}.{threading.get_ident()}.tmp'
+            with open(temporary_path, 'wb') as file:
+                np.savez(file, packed_mask=np.frombuffer(entry[1], dtype=np.uint8), shape=mask.shape)
+            os.replace(temporary_path, path)
+
+    def _remember(self, key: str, entry) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f'{key}.npz')
+
+    def _load_from_disk(self, key: str):
+        if not self.cache_dir:
+            return None
+        path = self._path(key)
+        try:
+            expires_at = os.path.getmtime(path) + self.ttl_seconds
+            if expires_at < time.time():
+                os.remove(path)
+                return None
+            with np.load(path) as stored:
+                return expires_at, stored['packed_mask'].tobytes(), tuple(stored['shape'])
+        except (FileNotFoundError, ValueError, KeyError):
+            return None
+
+
+def unpack_mask(packed_mask: bytes, shape: Tuple[int, int]) -> np.ndarray:
+    """Restores a black and white (0/255) mask from its bit-packed form."""
+    bits = np.unpackbits(
+        np.frombuffer(packed_mask, dtype=np.uint8),
+        count=shape[0] * shape[1]
+    )
+    return (bits * 255).reshape(shape)
+
+
+result_cache = ResultCache()
+probability_cache = ResultCache(
+    max_entries=PROBABILITY_CACHE_MAX_ENTRIES,
+    cache_dir=PROBABILITY_CACHE_DIR,
+    bit_packed=False,
+    name='probability'
+)
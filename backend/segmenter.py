@@ -1,3 +1,4 @@
+from typing import List
 import numpy as np
 
 def segment(img_array: np.array, model, threshold: int = 0.7) -> np.array:
@@ -7,3 +8,32 @@ def segment(img_array: np.array, model, threshold: int = 0.7) -> np.array:
     predicted_img_array = model.predict(np.expand_dims(img_array, axis=0))[0, :, :, 0]
     black_white_img_array = (predicted_img_array > threshold).astype(np.uint8) * 255
     return black_white_img_array
+
+
+def predict_batch(
+        img_arrays: List[np.array],
+        model,
+        batch_size: int = 8
+    ) -> np.array:
+    """Takes a list of scaled image arrays of equal shape, stacks them into one
+    tensor and predicts all rainforest probabilities in a single pass, in chunks
+    of batch_size. Returns a (number of images, 512, 512) array.
+    """
+    img_batch = np.stack(img_arrays).astype(np.float32, copy=False)
+    predicted_batch = model.predict(
+        img_batch,
+        batch_size=batch_size,
+        verbose=0
+    )[:, :, :, 0]
+    return predicted_batch
+
+
+def quantize_probabilities(predicted_img_array: np.array) -> np.array:
+    """Quantizes sigmoid probabilities to uint8, 0 to 255 for 0.0 to 1.0."""
+    return np.round(predicted_img_array * 255).astype(np.uint8)
+
+
+def threshold_probabilities(probability_img_array: np.array, threshold: float = 0.7) -> np.array:
+    """Converts a quantized probability map to a black and white img_array.
+    Works on stacks of maps as well."""
+    return (probability_img_array > threshold * 255).astype(np.uint8) * 255
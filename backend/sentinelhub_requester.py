@@ -1,7 +1,10 @@
 import os
+import threading
 import datetime as dt
-from typing import Tuple
+from typing import List, Optional, Tuple
 import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
 from sentinelhub import (
     SHConfig,
     CRS,
@@ -9,9 +12,30 @@ from sentinelhub import (
     DataCollection,
     MimeType,
     SentinelHubRequest,
-    SentinelHubCatalog
+    SentinelHubCatalog,
+    SentinelHubDownloadClient,
+    SentinelHubSession
 )
+from sentinelhub.download import DownloadRequest
 from backend.utils import timeframe_constructor
+from backend.instrumentation import stage_timer
+
+# Largest output size (per side) the Process API accepts in a single request.
+MAX_REQUEST_SIZE_PX = 2500
+SENTINELHUB_BASE_URL = os.getenv('SENTINELHUB_BASE_URL')
+# The predefined collection pins the main deployment for Process API calls.
+L2A_COLLECTION = (
+    DataCollection.SENTINEL2_L2A.define_from(
+        'SENTINEL2_L2A_CUSTOM_DEPLOYMENT',
+        service_url=SENTINELHUB_BASE_URL
+    )
+    if SENTINELHUB_BASE_URL
+    else DataCollection.SENTINEL2_L2A
+)
+# Keep-alive connections per host, enough for the concurrent downloads of
+# several requests.
+SENTINELHUB_POOL_SIZE = int(os.getenv('SENTINELHUB_POOL_SIZE', '16'))
+TOKEN_REFRESH_BEFORE_EXPIRY_S = 300
 
 
 def create_bounding_box(
@@ -39,21 +63,139 @@ def create_bounding_box(
     west_lon = round(lon_deg + (sq_length_m / 2 / delta_meter_per_deg_lon), 5)
     return BBox((east_lon, south_lat, west_lon, north_lat), crs=CRS.WGS84)
 
-def create_sentinelhub_token() -> Tuple[SHConfig, SentinelHubCatalog]:
+
+def side_length_to_image_size(side_length_km: float, resolution_m_per_px=10) -> int:
+    """
+    Returns the image size in pixels of a square with the given side length,
+    matching the square length convention of create_bounding_box.
+    Raises a ValueError if the square exceeds a single Process API request.
+    """
+    image_size_px = int(round(side_length_km * 1000 / resolution_m_per_px)) + 1
+    if image_size_px > MAX_REQUEST_SIZE_PX:
+        raise ValueError(
+            f"A side length of {side_length_km} km exceeds the maximum of "
+            f"{(MAX_REQUEST_SIZE_PX - 1) * resolution_m_per_px / 1000} km."
+        )
+    return image_size_px
+
+
+class PooledDownloadClient(SentinelHubDownloadClient):
+    """
+    Download client that sends its requests through a shared requests.Session,
+    so connections are kept alive across clients, and that serialises the
+    rate limiting and token refreshes of all clients with one shared lock.
+    """
+
+    def __init__(self, *, http_session: requests.Session, pool_lock: threading.RLock, **kwargs):
+        super().__init__(**kwargs)
+        self.http_session = http_session
+        self.pool_lock = pool_lock
+
+    def _execute_thread_safe(self, thread_unsafe_function, *args, **kwargs):
+        with self.pool_lock:
+            return thread_unsafe_function(*args, **kwargs)
+
+    def _do_download(self, request: DownloadRequest) -> requests.Response:
+        if request.url is None:
+            raise ValueError(f"Faulty request {request}, no URL specified.")
+        return self.http_session.request(
+            request.request_type.value,
+            url=request.url,
+            json=request.post_values,
+            headers=self._prepare_headers(request),
+            timeout=self.config.download_timeout_seconds
+        )
+
+
+class SentinelHubPool:
     """
-    Creates an access token with sentinelhub to be used for one hour.
-    returns the configuration to be used for requests.
+    Process-wide Sentinel Hub configuration, OAuth session and HTTP
+    connections, shared by the catalog and Process API calls of all requests.
+    The token is fetched once and refreshed TOKEN_REFRESH_BEFORE_EXPIRY_S
+    seconds before it expires. Everything is created on first use.
     """
-    config = SHConfig()
-    config.sh_client_id = os.getenv('SENTINEL_CLIENT_ID')
-    config.sh_client_secret = os.getenv('SENTINEL_CLIENT_SECRET')
-    if not config.sh_client_id or not config.sh_client_secret:
-        print(
-            "Warning! To use Process API, please provide the credentials",
-            "(OAuth client ID and client secret)."
+
+    def __init__(self, pool_size: int = SENTINELHUB_POOL_SIZE):
+        self.pool_size = pool_size
+        self._lock = threading.RLock()
+        self._config: Optional[SHConfig] = None
+        self._session: Optional[SentinelHubSession] = None
+        self._http_session: Optional[requests.Session] = None
+        self._catalog: Optional[SentinelHubCatalog] = None
+
+    def config(self) -> SHConfig:
+        with self._lock:
+            if self._config is None:
+                config = SHConfig()
+                config.sh_client_id = os.getenv('SENTINEL_CLIENT_ID')
+                config.sh_client_secret = os.getenv('SENTINEL_CLIENT_SECRET')
+                if SENTINELHUB_BASE_URL:
+                    # Points the backend at another deployment, e.g. backend.fake_sentinelhub.
+                    config.sh_base_url = SENTINELHUB_BASE_URL
+                    config.sh_token_url = f"{SENTINELHUB_BASE_URL}/oauth/token"
+                    if SENTINELHUB_BASE_URL.startswith('http://'):
+                        os.environ.setdefault('OAUTHLIB_INSECURE_TRANSPORT', '1')
+                if not config.sh_client_id or not config.sh_client_secret:
+                    print(
+                        "Warning! To use Process API, please provide the credentials",
+                        "(OAuth client ID and client secret)."
+                    )
+                self._config = config
+            return self._config
+
+    def session(self) -> SentinelHubSession:
+        """Returns the shared OAuth session, fetching the token on first use.
+        It is also cached for plain SentinelHubDownloadClient instances."""
+        with self._lock:
+            if self._session is None:
+                session = SentinelHubSession(
+                    config=self.config(),
+                    refresh_before_expiry=TOKEN_REFRESH_BEFORE_EXPIRY_S
+                )
+                SentinelHubDownloadClient.cache_session(session)
+                self._session = session
+            return self._session
+
+    def http_session(self) -> requests.Session:
+        with self._lock:
+            if self._http_session is None:
+                http_session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size)
+                http_session.mount('https://', adapter)
+                http_session.mount('http://', adapter)
+                self._http_session = http_session
+            return self._http_session
+
+    def client(self, config: Optional[SHConfig] = None, default_retry_time: float = 30) -> PooledDownloadClient:
+        """Returns a download client on the shared session and connections.
+        Clients are cheap, create one per download."""
+        return PooledDownloadClient(
+            config=config or self.config(),
+            session=self.session(),
+            http_session=self.http_session(),
+            pool_lock=self._lock,
+            default_retry_time=default_retry_time
         )
-    catalog = SentinelHubCatalog(config=config)
-    return config, catalog
+
+    def catalog(self) -> SentinelHubCatalog:
+        with self._lock:
+            if self._catalog is None:
+                catalog = SentinelHubCatalog(config=self.config())
+                catalog.client = self.client()
+                self._catalog = catalog
+            return self._catalog
+
+
+sentinelhub_pool = SentinelHubPool()
+
+
+def create_sentinelhub_token() -> Tuple[SHConfig, SentinelHubCatalog]:
+    """
+    Returns the configuration and catalog to be used for requests, shared
+    across requests through sentinelhub_pool. The access token is reused
+    until shortly before it expires.
+    """
+    return sentinelhub_pool.config(), sentinelhub_pool.catalog()
 
 
 def search_optimal_l2a_tiles(
@@ -72,20 +214,75 @@ def search_optimal_l2a_tiles(
         date_request,
         temporal_padding=range_days
     )
-    results = list(catalog.search(
-        DataCollection.SENTINEL2_L2A,
-        bbox=bbox,
-        time=time_interval,
-        filter=f"eo:cloud_cover < {max_cloud_coverage}",
-        fields={
-            "include": [
-                "id",
-                "properties.datetime",
-                "properties.eo:cloud_cover"
-            ],
-            "exclude": []
-        },
-    ))
+    results = _search_l2a_tiles(catalog, bbox, time_interval, max_cloud_coverage)
+    return choose_optimal_tile(results, date_request)
+
+
+def search_optimal_l2a_tiles_for_dates(
+        catalog: SentinelHubCatalog,
+        bbox: BBox,
+        date_list: List[str],
+        range_days: int=91,
+        max_cloud_coverage: int=10
+    ) -> List[dict | None]:
+    """
+    Same as search_optimal_l2a_tiles for several requested dates, but with a
+    single catalog search spanning all dates plus padding. Each date is then
+    assigned the tile with the lowest penalty among the tiles within
+    range_days of it. Returns one dict (or None) per requested date.
+    """
+    if not date_list:
+        return []
+    time_interval = (
+        timeframe_constructor(min(date_list), temporal_padding=range_days)[0],
+        timeframe_constructor(max(date_list), temporal_padding=range_days)[1]
+    )
+    results = _search_l2a_tiles(catalog, bbox, time_interval, max_cloud_coverage)
+    optimal_tiles = []
+    for date_request in date_list:
+        window_start, window_end = timeframe_constructor(
+            date_request,
+            temporal_padding=range_days
+        )
+        results_in_window = [
+            tile for tile in results
+            if window_start <= tile.get('properties').get('datetime')[:10] <= window_end
+        ]
+        optimal_tiles.append(choose_optimal_tile(results_in_window, date_request))
+    return optimal_tiles
+
+
+def _search_l2a_tiles(
+        catalog: SentinelHubCatalog,
+        bbox: BBox,
+        time_interval: Tuple[str, str],
+        max_cloud_coverage: int
+    ) -> List[dict]:
+    """Runs a catalog search for L2A tiles below the maximum cloud coverage."""
+    with stage_timer('catalog_search'):
+        results = list(catalog.search(
+            DataCollection.SENTINEL2_L2A,
+            bbox=bbox,
+            time=time_interval,
+            filter=f"eo:cloud_cover < {max_cloud_coverage}",
+            fields={
+                "include": [
+                    "id",
+                    "properties.datetime",
+                    "properties.eo:cloud_cover"
+                ],
+                "exclude": []
+            },
+        ))
+    return results
+
+
+def choose_optimal_tile(results: List[dict], date_request: str) -> (dict | None):
+    """
+    Chooses the catalog result which minimizes the penalty
+    10 * cloud cover + days offset to the requested date.
+    Returns a dict with the best tile, or None if there are no results.
+    """
     if not results:
         return None
     properties = []
@@ -169,15 +366,42 @@ def build_sentinel_request(
             ];
         }
     """
+    # True color channels and the raw B08 band from a single scene. L2A digital
+    # numbers are reflectance scaled by 10000, hence the conversion.
+    evalscript_combined = """
+        //VERSION=3
+        function setup() {
+            return {
+                input: [{
+                    bands: ["B02","B03","B04","B08"],
+                    units: "DN"
+                }],
+                output: {
+                    bands: 4,
+                    sampleType: "FLOAT32"
+                }
+            };
+        }
+        function evaluatePixel(sample) {
+            return [
+                2.5 * sample.B04 / 10000,
+                2.5 * sample.B03 / 10000,
+                2.5 * sample.B02 / 10000,
+                sample.B08,
+            ];
+        }
+    """
     if request_type == 'TrueColor':
         evalscript = evalscript_true_color
     elif request_type == '4-band':
         evalscript = evalscript_four_bands
+    elif request_type == 'Combined':
+        evalscript = evalscript_combined
     request = SentinelHubRequest(
         evalscript=evalscript,
         input_data=[
             SentinelHubRequest.input_data(
-                data_collection=DataCollection.SENTINEL2_L2A,
+                data_collection=L2A_COLLECTION,
                 time_interval=request_date,
                 other_args={
                     "dataFilter": {
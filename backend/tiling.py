@@ -0,0 +1,81 @@
+from typing import Callable, List, Optional, Tuple
+import numpy as np
+
+
+def window_origins(length: int, window_size: int, overlap: int) -> List[int]:
+    """Returns the start offsets of overlapping windows covering an axis of the
+    given length. The last window is aligned to the end of the axis."""
+    if length <= window_size:
+        return [0]
+    stride = window_size - overlap
+    origins = list(range(0, length - window_size, stride))
+    origins.append(length - window_size)
+    return origins
+
+
+def blend_weights(window_size: int, overlap: int) -> np.ndarray:
+    """Returns a (window_size, window_size) weight map which ramps down linearly
+    within the overlap margin, so that neighbouring windows fade into each
+    other instead of producing seams."""
+    if overlap <= 0:
+        return np.ones((window_size, window_size), dtype=np.float32)
+    distance_to_edge = np.minimum(
+        np.arange(1, window_size + 1),
+        np.arange(window_size, 0, -1)
+    )
+    ramp = np.minimum(distance_to_edge, overlap).astype(np.float32) / overlap
+    return np.outer(ramp, ramp)
+
+
+def segment_tiled(
+        img_array: np.ndarray,
+        model,
+        threshold: float = 0.7,
+        window_size: int = 512,
+        overlap: int = 64,
+        batch_size: int = 8,
+        scale_window: Optional[Callable[[np.ndarray], np.ndarray]] = None
+    ) -> np.ndarray:
+    """Takes a (height, width, 4) image array of any size, cuts it into
+    overlapping windows, predicts them batch by batch and blends the predicted
+    probabilities back into one mosaic. scale_window turns a window into model
+    input, so windows are scaled like single tiles; without it, img_array must
+    already be scaled. Only batch_size windows are held as model input at any
+    time. Returns a (height, width) black and white array.
+    """
+    height, width = img_array.shape[:2]
+    padded_array = img_array
+    if height < window_size or width < window_size:
+        padded_array = np.pad(
+            img_array,
+            ((0, max(window_size - height, 0)), (0, max(window_size - width, 0)), (0, 0)),
+            mode='edge'
+        )
+    padded_height, padded_width = padded_array.shape[:2]
+    weights = blend_weights(window_size, overlap)
+    probability_sum = np.zeros((padded_height, padded_width), dtype=np.float32)
+    weight_sum = np.zeros((padded_height, padded_width), dtype=np.float32)
+    windows: List[Tuple[int, int]] = [
+        (row, col)
+        for row in window_origins(padded_height, window_size, overlap)
+        for col in window_origins(padded_width, window_size, overlap)
+    ]
+    scale = scale_window or np.asarray
+    for batch_start in range(0, len(windows), batch_size):
+        batch_windows = windows[batch_start:batch_start + batch_size]
+        window_batch = np.stack([
+            scale(padded_array[row:row + window_size, col:col + window_size])
+            for row, col in batch_windows
+        ]).astype(np.float32, copy=False)
+        predicted_batch = model.predict(
+            window_batch,
+            batch_size=batch_size,
+            verbose=0
+        )[:, :, :, 0]
+        for (row, col), predicted_window in zip(batch_windows, predicted_batch):
+            probability_sum[row:row + window_size, col:col + window_size] += (
+                predicted_window * weights
+            )
+            weight_sum[row:row + window_size, col:col + window_size] += weights
+    probability_mosaic = (probability_sum / weight_sum)[:height, :width]
+    return (probability_mosaic > threshold).astype(np.uint8) * 255
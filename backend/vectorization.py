@@ -0,0 +1,249 @@
+from typing import Dict, List
+import cv2
+import numpy as np
+import shapely
+from sentinelhub import BBox
+
+
+SIMPLIFY_TOLERANCE_PX = 1.5
+MIN_POLYGON_AREA_PX = 16
+
+
+def _edge_grid(mask: np.ndarray) -> np.ndarray:
+    """
+    Returns a (2 * height + 3, 2 * width + 3) grid whose point (2 * x + 1,
+    2 * y + 1) is the pixel corner (x, y) of mask, set where the point lies
+    on or inside a white pixel. Contours traced on the grid thereby follow
+    the pixel edges instead of the centres of the boundary pixels. The grid
+    has a blank frame, so outlines along the image border are traced too.
+    """
+    height, width = mask.shape
+    white = (mask > 0).astype(np.uint8)
+    grid = np.zeros((2 * height + 3, 2 * width + 3), dtype=np.uint8)
+    grid[1:-2, 1:-2] = cv2.resize(
+        white, (2 * width, 2 * height), interpolation=cv2.INTER_NEAREST
+    )
+    # Every white pixel covers its closed square, 3 x 3 grid points.
+    return cv2.dilate(grid, np.ones((2, 2), dtype=np.uint8), anchor=(1, 1))
+
+
+def _restore_corners(contours, boundary: np.ndarray) -> List[np.ndarray]:
+    """
+    cv2 traces with 8-connectivity and cuts concave corners and the corners
+    of holes with a diagonal step. Pixel edges only run along grid lines, so
+    every diagonal step is replaced by the two steps through the skipped
+    corner, the candidate point that lies on the boundary of the grid. All
+    contours are processed in one pass.
+    """
+    lengths = np.array([len(contour) for contour in contours])
+    starts = np.cumsum(lengths) - lengths
+    points = np.concatenate(contours).reshape(-1, 2)
+    next_indices = np.arange(1, len(points) + 1)
+    next_indices[starts + lengths - 1] = starts
+    next_points = points[next_indices]
+    diagonal = np.all(points != next_points, axis=1)
+    horizontal_first = np.column_stack((next_points[:, 0], points[:, 1]))
+    vertical_first = np.column_stack((points[:, 0], next_points[:, 1]))
+    corners = np.where(
+        (boundary[horizontal_first[:, 1], horizontal_first[:, 0]] > 0)[:, np.newaxis],
+        horizontal_first,
+        vertical_first
+    )[diagonal]
+    restored = np.insert(points, np.flatnonzero(diagonal) + 1, corners, axis=0)
+    restored_lengths = lengths + np.add.reduceat(diagonal.astype(np.int64), starts)
+    return [
+        contour.reshape(-1, 1, 2)
+        for contour in np.split(restored.astype(np.int32), np.cumsum(restored_lengths)[:-1])
+    ]
+
+
+def _to_lon_lat(points: np.ndarray, bbox: BBox, shape) -> np.ndarray:
+    """Converts points on the edge grid of the framed mask into (lon, lat)
+    positions. Row 0 of a mask is the northern edge of the box."""
+    height, width = shape
+    min_lon, min_lat, max_lon, max_lat = bbox
+    corners = (points - 3) / 2
+    lons = min_lon + corners[:, 0] / width * (max_lon - min_lon)
+    lats = max_lat - corners[:, 1] / height * (max_lat - min_lat)
+    return np.round(np.column_stack((lons, lats)), 6)
+
+
+def _pinch_grid(mask: np.ndarray) -> np.ndarray:
+    """Returns an edge grid of mask that is set at the pixel corners where
+    exactly two diagonal pixels are white, the only points a ring can pass
+    twice."""
+    white = np.pad(mask > 0, 1)
+    top_left, top_right = white[:-1, :-1], white[:-1, 1:]
+    bottom_left, bottom_right = white[1:, :-1], white[1:, 1:]
+    height, width = mask.shape
+    pinches = np.zeros((2 * height + 3, 2 * width + 3), dtype=bool)
+    pinches[1:2 * height + 2:2, 1:2 * width + 2:2] = (
+        (top_left == bottom_right) & (top_right == bottom_left) & (top_left != top_right)
+    )
+    return pinches
+
+
+def _split_pinches(ring: np.ndarray, pinches: np.ndarray) -> List[np.ndarray]:
+    """
+    Splits a ring that passes a pinch corner twice, which is not a valid
+    ring, into simple rings, largest first. The stretches between two visits
+    of a corner are taken off a stack, innermost first.
+    """
+    at_pinch = np.flatnonzero(pinches[ring[:, 1], ring[:, 0]])
+    keys = ring[at_pinch, 1].astype(np.int64) * pinches.shape[1] + ring[at_pinch, 0]
+    _, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    repeated = counts[inverse] > 1
+    keep = np.ones(len(ring), dtype=bool)
+    loops = []
+    stack = []
+    open_corners = set()
+    for index, corner in zip(at_pinch[repeated].tolist(), inverse[repeated].tolist()):
+        if corner in open_corners:
+            open_corner = None
+            while open_corner != corner:
+                open_corner, start = stack.pop()
+                open_corners.discard(open_corner)
+            loops.append(ring[start:index][keep[start:index]])
+            keep[start:index] = False
+        stack.append((corner, index))
+        open_corners.add(corner)
+    loops.append(ring[keep])
+    loops = [loop for loop in loops if len(loop) >= 3]
+    return sorted(loops, key=lambda loop: cv2.contourArea(loop), reverse=True)
+
+
+def _polygons_of(geometry) -> List[shapely.Polygon]:
+    """Returns the polygons of a geometry, dropping collapsed parts."""
+    return [
+        part for part in shapely.get_parts(geometry)
+        if isinstance(part, shapely.Polygon) and not part.is_empty
+    ]
+
+
+def _to_polygons(polygons: List[List[np.ndarray]]) -> np.ndarray:
+    """Builds an array of polygons from the rings, exterior first, of each
+    polygon."""
+    rings = [ring for polygon in polygons for ring in polygon]
+    linear_rings = shapely.linearrings(
+        np.concatenate(rings).astype(np.float64),
+        indices=np.repeat(np.arange(len(rings)), [len(ring) for ring in rings])
+    )
+    return shapely.polygons(
+        linear_rings,
+        indices=np.repeat(np.arange(len(polygons)), [len(polygon) for polygon in polygons])
+    )
+
+
+def mask_to_polygons(
+        mask: np.ndarray,
+        bbox: BBox,
+        simplify_tolerance_px: float = SIMPLIFY_TOLERANCE_PX,
+        min_area_px: float = MIN_POLYGON_AREA_PX
+    ) -> Dict:
+    """
+    Vectorises the white areas of a black and white mask into a valid GeoJSON
+    MultiPolygon in the coordinates of bbox (WGS84). Outlines run along the
+    pixel edges, so a polygon covers exactly the area of its pixels before
+    it is simplified with Douglas-Peucker at simplify_tolerance_px, or
+    without changing the topology where that is not valid. Polygons and
+    holes smaller than min_area_px pixels are dropped.
+    """
+    # Grid units are half pixels. The black pixels and a black frame are
+    # traced, so every white area is the hole of a black outline. White
+    # pixels touching at a corner only thereby belong to separate polygons,
+    # since a polygon's interior has to be connected, and the black areas
+    # inside a white area are its children.
+    framed = np.pad(mask == 0, 1, constant_values=True)
+    grid = _edge_grid(framed)
+    boundary = grid - cv2.erode(grid, np.ones((3, 3), dtype=np.uint8))
+    contours, hierarchy = cv2.findContours(
+        grid,
+        cv2.RETR_TREE,
+        cv2.CHAIN_APPROX_SIMPLE
+    )
+    rings = [contour.reshape(-1, 2) for contour in _restore_corners(contours, boundary)]
+    # A white area whose black surroundings touch at a corner, or a black
+    # area whose pixels do, is traced with a ring passing the corner twice.
+    pinches = _pinch_grid(framed)
+    points = np.concatenate(rings)
+    ring_indices = np.repeat(np.arange(len(rings)), [len(ring) for ring in rings])
+    at_pinch = pinches[points[:, 1], points[:, 0]]
+    keys = (
+        ring_indices[at_pinch] * pinches.size
+        + points[at_pinch, 1].astype(np.int64) * pinches.shape[1] + points[at_pinch, 0]
+    )
+    unique_keys, counts = np.unique(keys, return_counts=True)
+    pinched = set((unique_keys[counts > 1] // pinches.size).tolist())
+    hierarchy = hierarchy[0].tolist()
+    is_hole = {-1: True}
+    polygons = []
+    # Parents are traced before their children.
+    for index, (_, _, first_child, parent) in enumerate(hierarchy):
+        is_hole[index] = not is_hole[parent]
+        if not is_hole[index]:
+            continue
+        # Loops split off a white area's outline touch it from the inside and
+        # are holes, like the black areas inside it.
+        polygon = _split_pinches(rings[index], pinches) if index in pinched else [rings[index]]
+        child = first_child
+        while child != -1:
+            polygon.extend(
+                _split_pinches(rings[child], pinches) if child in pinched else [rings[child]]
+            )
+            child = hierarchy[child][0]
+        polygons.append(polygon)
+    forest = shapely.multipolygons(_to_polygons(polygons)) if polygons else shapely.MultiPolygon()
+    tolerance = 2 * simplify_tolerance_px
+    simplified = _polygons_of(shapely.simplify(forest, tolerance, preserve_topology=False))
+    # Douglas-Peucker is fast but may let rings cross. A collection counts as
+    # valid even where its members overlap, so the MultiPolygon is checked.
+    if not shapely.MultiPolygon(simplified).is_valid:
+        simplified = _polygons_of(shapely.simplify(forest, tolerance, preserve_topology=True))
+        if not shapely.MultiPolygon(simplified).is_valid:
+            simplified = _polygons_of(shapely.make_valid(shapely.MultiPolygon(simplified)))
+    if not simplified:
+        return {"type": "MultiPolygon", "coordinates": []}
+    simplified_rings, polygon_indices = shapely.get_rings(simplified, return_index=True)
+    exterior = np.r_[True, polygon_indices[1:] != polygon_indices[:-1]]
+    ring_areas = shapely.area(shapely.polygons(simplified_rings))
+    # Dropping holes or whole polygons keeps the rest valid.
+    min_area = 4 * min_area_px
+    keep_polygon = (ring_areas[exterior] >= min_area)[np.cumsum(exterior) - 1]
+    keep = (ring_areas >= min_area) & keep_polygon
+    coordinates, ring_of_point = shapely.get_coordinates(
+        simplified_rings[keep], return_index=True
+    )
+    positions = np.split(
+        _to_lon_lat(coordinates, bbox, mask.shape),
+        np.flatnonzero(np.diff(ring_of_point)) + 1
+    )
+    multipolygon = []
+    for ring, is_exterior in zip(positions, exterior[keep]):
+        if is_exterior:
+            multipolygon.append([])
+        multipolygon[-1].append(ring.tolist())
+    return {"type": "MultiPolygon", "coordinates": multipolygon}
+
+
+def masks_to_geojson(dates: List[str], segmented_img_arrays: List[np.ndarray], bbox: BBox) -> Dict:
+    """
+    Returns a GeoJSON FeatureCollection with one 'forest' feature per date and
+    a 'loss' feature with the forest of the first date that is gone at the
+    last date, the vector form of the total change overlay.
+    """
+    features = [
+        {
+            "type": "Feature",
+            "geometry": mask_to_polygons(segmented_img, bbox),
+            "properties": {"kind": "forest", "date": date}
+        }
+        for date, segmented_img in zip(dates, segmented_img_arrays)
+    ]
+    if len(segmented_img_arrays) > 1:
+        loss_mask = (segmented_img_arrays[0] > 0) & (segmented_img_arrays[-1] == 0)
+        features.append({
+            "type": "Feature",
+            "geometry": mask_to_polygons(loss_mask, bbox),
+            "properties": {"kind": "loss", "date": dates[-1], "since": dates[0]}
+        })
+    return {"type": "FeatureCollection", "features": features}
@@ -0,0 +1,71 @@
+"""
+Shows how the vectorised metrics engine scales with the number of sites and
+dates, against calling the single-site calculate_metrics once per site.
+
+    python benchmarks/metrics_benchmark.py --sites 10 100 1000 --dates 10 100 1000
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'frontend'))
+from utils.metrics_processing import calculate_site_metrics
+
+
+def synthetic_coverage_table(number_of_sites: int, number_of_dates: int) -> pd.DataFrame:
+    """Returns a long site/date/coverage table with dates spaced ~ a month apart."""
+    rng = np.random.default_rng(0)
+    dates = np.datetime64('2016-01-01') + np.arange(number_of_dates) * 30
+    return pd.DataFrame({
+        "site": np.repeat(np.arange(number_of_sites), number_of_dates),
+        "date": np.tile(np.datetime_as_string(dates, unit='D'), number_of_sites),
+        "coverage": rng.uniform(0, 100, number_of_sites * number_of_dates)
+    })
+
+
+def time_call(function, *args, repeats: int = 3) -> float:
+    """Returns the best wall time of repeats calls in seconds."""
+    timings = []
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        function(*args)
+        timings.append(time.perf_counter() - start_time)
+    return min(timings)
+
+
+def per_site_loop(coverage_table: pd.DataFrame) -> list:
+    return [
+        calculate_site_metrics(site_table)
+        for _, site_table in coverage_table.groupby("site")
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n', maxsplit=1)[0].strip())
+    parser.add_argument('--sites', nargs='*', type=int, default=[10, 100, 1000])
+    parser.add_argument('--dates', nargs='*', type=int, default=[10, 100, 1000])
+    parser.add_argument('--loop-limit', type=int, default=100_000,
+                        help='skip the per-site loop above this many rows')
+    args = parser.parse_args()
+
+    print(f"{'sites':>7} {'dates':>7} {'rows':>10} {'vectorised s':>13} {'rows/s':>12} {'per-site loop s':>16}")
+    for number_of_sites in args.sites:
+        for number_of_dates in args.dates:
+            coverage_table = synthetic_coverage_table(number_of_sites, number_of_dates)
+            vectorised_time = time_call(calculate_site_metrics, coverage_table)
+            loop_time = (
+                f"{time_call(per_site_loop, coverage_table, repeats=1):>16.3f}"
+                if len(coverage_table) <= args.loop_limit
+                else f"{'-':>16}"
+            )
+            print(
+                f"{number_of_sites:>7} {number_of_dates:>7} {len(coverage_table):>10} "
+                f"{vectorised_time:>13.3f} {len(coverage_table) / vectorised_time:>12.0f} {loop_time}"
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,272 @@
+"""
+Offline microbenchmarks of the backend and frontend hot paths on synthetic
+512 x 512 data.
+
+    python benchmarks/suite.py run --output benchmarks/baselines/baseline.json
+    python benchmarks/suite.py compare benchmarks/baselines/baseline.json current.json
+
+run times every benchmark (or the ones given with --only) and writes the
+median and best time per call as JSON. compare flags every benchmark whose
+best time, the least noisy figure, got slower than the baseline by more than
+--tolerance and exits with status 1 if there is any regression. Baselines are
+machine specific, record a new one when the hardware changes.
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import datetime as dt
+from typing import Callable, Dict
+import numpy as np
+import cv2
+
+REPOSITORY_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, REPOSITORY_ROOT)
+sys.path.insert(0, os.path.join(REPOSITORY_ROOT, 'frontend'))
+
+IMAGE_SIZE_PX = 512
+BENCHMARKS: Dict[str, Callable[[], Callable[[], object]]] = {}
+
+
+def benchmark(function):
+    """Registers a benchmark. The decorated function prepares the synthetic
+    inputs and returns the callable that is timed."""
+    BENCHMARKS[function.__name__] = function
+    return function
+
+
+class StandInModel:
+    """Cheap replacement for the segmentation model with the same predict
+    interface: a smoothed, squashed NIR minus red index per pixel."""
+
+    def predict(self, img_batch, batch_size=8, verbose=0):
+        predicted_imgs = []
+        for img_array in img_batch:
+            index = cv2.blur(img_array[:, :, 3] - img_array[:, :, 0], (3, 3))
+            predicted_imgs.append(1 / (1 + np.exp(-8 * index)))
+        return np.stack(predicted_imgs)[:, :, :, np.newaxis]
+
+
+def synthetic_scene(seed: int = 0) -> np.ndarray:
+    """Returns a (512, 512, 4) float32 array like the Process API output."""
+    rng = np.random.default_rng(seed)
+    scene = rng.random((IMAGE_SIZE_PX, IMAGE_SIZE_PX, 4), dtype=np.float32) * 0.4
+    scene[:, :, 3] *= 10000
+    return scene
+
+
+def synthetic_mask(seed: int = 0, share: float = 0.5) -> np.ndarray:
+    """Returns a blobby black and white (0/255) mask."""
+    rng = np.random.default_rng(seed)
+    noise = cv2.GaussianBlur(rng.random((IMAGE_SIZE_PX, IMAGE_SIZE_PX)), (0, 0), 8)
+    return (noise > np.quantile(noise, share)).astype(np.uint8) * 255
+
+
+@benchmark
+def segment():
+    from backend.segmenter import segment as segment_image
+    model = StandInModel()
+    model_input = synthetic_scene()
+    return lambda: segment_image(model_input, model)
+
+
+@benchmark
+def predict_batch_8():
+    from backend.segmenter import predict_batch
+    model = StandInModel()
+    model_inputs = [synthetic_scene(seed) for seed in range(8)]
+    return lambda: predict_batch(model_inputs, model)
+
+
+@benchmark
+def preprocess_image():
+    from backend.main import preprocess_image as preprocess
+    scene = synthetic_scene()
+    return lambda: preprocess(scene)
+
+
+@benchmark
+def numpy_to_base64():
+    from backend.main import numpy_to_base64 as encode
+    mask = synthetic_mask()
+    return lambda: encode(mask)
+
+
+@benchmark
+def base64_to_numpy():
+    from backend.main import numpy_to_base64 as encode
+    from utils.response_parsing import base64_to_numpy as decode
+    img_b64 = encode(synthetic_mask())
+    return lambda: decode(img_b64)
+
+
+@benchmark
+def msgpack_response():
+    from backend.encoding import to_msgpack
+    response_content = {
+        "segmented_img_list": [synthetic_mask(seed) for seed in range(2)],
+        "original_img_list": [
+            (synthetic_scene(seed)[:, :, :3] * 255).astype(np.uint8)
+            for seed in range(2)
+        ]
+    }
+    return lambda: to_msgpack(
+        response_content,
+        mask_keys=("segmented_img_list",),
+        image_keys=("original_img_list",)
+    )
+
+
+@benchmark
+def calculate_metrics():
+    from utils.metrics_processing import calculate_metrics as calculate
+    dates = [f'20{year}-06-30' for year in range(17, 25)]
+    masks = [synthetic_mask(seed, share=0.3 + seed / 20) for seed in range(len(dates))]
+    return lambda: calculate(dates, masks)
+
+
+@benchmark
+def calculate_site_metrics_1000x100():
+    import pandas as pd
+    from utils.metrics_processing import calculate_site_metrics
+    dates = np.datetime64('2016-01-01') + np.arange(100) * 30
+    coverage_table = pd.DataFrame({
+        "site": np.repeat(np.arange(1000), len(dates)),
+        "date": np.tile(np.datetime_as_string(dates, unit='D'), 1000),
+        "coverage": np.random.default_rng(0).uniform(0, 100, 1000 * len(dates))
+    })
+    return lambda: calculate_site_metrics(coverage_table)
+
+
+@benchmark
+def render_overlays():
+    from utils.graphics_processing import render_overlays as render
+    start_image = (synthetic_scene(0)[:, :, :3] * 255).astype(np.uint8)
+    end_image = (synthetic_scene(1)[:, :, :3] * 255).astype(np.uint8)
+    start_mask, end_mask = synthetic_mask(0, 0.3), synthetic_mask(0, 0.5)
+    return lambda: render(start_image, end_image, start_mask, end_mask, "#00B272", "#994636")
+
+
+@benchmark
+def bw_to_color():
+    from utils.graphics_processing import bw_to_color as colorize
+    mask = synthetic_mask()
+    return lambda: colorize(mask, "#994636", "#00B272")
+
+
+@benchmark
+def create_bounding_box():
+    from backend.sentinelhub_requester import create_bounding_box as create_box
+    return lambda: create_box(-8.48638, -55.26209)
+
+
+@benchmark
+def mask_to_polygons():
+    from backend.sentinelhub_requester import create_bounding_box as create_box
+    from backend.vectorization import mask_to_polygons as vectorize
+    mask = synthetic_mask()
+    box = create_box(-8.48638, -55.26209)
+    return lambda: vectorize(mask, box)
+
+
+def time_benchmark(function: Callable[[], object], min_seconds: float, repeats: int) -> Dict:
+    """Calibrates the number of calls per repeat to last at least
+    min_seconds, then returns the median and best time per call."""
+    function()  # warm-up
+    number_of_calls = 1
+    while True:
+        start_time = time.perf_counter()
+        for _ in range(number_of_calls):
+            function()
+        elapsed = time.perf_counter() - start_time
+        if elapsed >= min_seconds:
+            break
+        number_of_calls *= 2
+    timings = [elapsed / number_of_calls]
+    for _ in range(repeats - 1):
+        start_time = time.perf_counter()
+        for _ in range(number_of_calls):
+            function()
+        timings.append((time.perf_counter() - start_time) / number_of_calls)
+    return {
+        "median_s": float(np.median(timings)),
+        "best_s": float(np.min(timings)),
+        "calls_per_repeat": number_of_calls,
+        "repeats": repeats
+    }
+
+
+def run(args) -> None:
+    names = args.only or list(BENCHMARKS)
+    results = {}
+    for name in names:
+        try:
+            function = BENCHMARKS[name]()
+        except ImportError as error:
+            print(f"{name:<32} skipped ({error})")
+            continue
+        results[name] = time_benchmark(function, args.min_seconds, args.repeats)
+        print(f"{name:<32} {results[name]['median_s'] * 1000:>10.3f} ms")
+    report = {
+        "created_at": dt.datetime.now().isoformat(timespec='seconds'),
+        "machine": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "processor": platform.processor() or platform.machine()
+        },
+        "results": results
+    }
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+        print(f"Wrote {args.output}")
+
+
+def compare(args) -> int:
+    with open(args.baseline, encoding='utf-8') as file:
+        baseline = json.load(file)["results"]
+    with open(args.current, encoding='utf-8') as file:
+        current = json.load(file)["results"]
+    regressions = 0
+    print(f"{'benchmark':<32} {'baseline ms':>12} {'current ms':>12} {'change':>8}")
+    for name in sorted(set(baseline) | set(current)):
+        if name not in baseline or name not in current:
+            print(f"{name:<32} only in {'current' if name in current else 'baseline'}")
+            continue
+        baseline_s, current_s = baseline[name]["best_s"], current[name]["best_s"]
+        change = current_s / baseline_s - 1
+        flag = ''
+        if change > args.tolerance:
+            flag = '  REGRESSION'
+            regressions += 1
+        elif change < -args.tolerance:
+            flag = '  faster'
+        print(f"{name:<32} {baseline_s * 1000:>12.3f} {current_s * 1000:>12.3f} {change:>+8.1%}{flag}")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n', maxsplit=1)[0].strip())
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    run_parser = subparsers.add_parser('run', help='time the benchmarks')
+    run_parser.add_argument('--output', help='JSON file to write the results to')
+    run_parser.add_argument('--only', nargs='*', choices=list(BENCHMARKS))
+    run_parser.add_argument('--min-seconds', type=float, default=0.2)
+    run_parser.add_argument('--repeats', type=int, default=5)
+    compare_parser = subparsers.add_parser('compare', help='flag regressions against a baseline')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--tolerance', type=float, default=0.2,
+                                help='allowed slowdown of the best time, 0.2 = 20%%')
+    args = parser.parse_args()
+    if args.command == 'run':
+        run(args)
+    else:
+        sys.exit(compare(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -14,12 +14,14 @@ from utils.metrics_processing import (
     convert_to_ha,
     calculate_metrics,
 )
-from utils.response_parsing import (
-    request_satellite_images,
-    parse_response,
+from utils.api_client import (
+    API_CACHE_MAX_ENTRIES,
+    backend_ready,
+    fetch_satellite_images,
+    stream_cached_satellite_images
 )
 from utils.graphics_processing import (
-    overlay_vector_on_image,
+    render_overlays,
     bw_to_color
 )
 
@@ -35,6 +37,7 @@ BOLIVIA_ICON_URL = 'https://vikfalk.github.io/deforestation_frontend/images/boli
 CLOUD_URL = "https://forestvision-llzimbumzq-oe.a.run.app/get_satellite_images"
 LOCAL_URL = "http://localhost:8080/get_satellite_images"
 API_URL = CLOUD_URL  # CLOUD_URL | LOCAL_URL
+STREAM_API_URL = API_URL.replace("get_satellite_images", "stream_satellite_images")
 
 
 def set_metrics_session_states(
@@ -64,23 +67,55 @@ def set_metrics_session_states(
     st.session_state.output = True
 
 
+@st.cache_data(max_entries=API_CACHE_MAX_ENTRIES, show_spinner=False)
+def create_overlays(start_raw, end_raw, start_segmented, end_segmented):
+    """Returns the start, end and total change overlays, cached across reruns
+    and sessions."""
+    return render_overlays(
+        start_image=start_raw,
+        end_image=end_raw,
+        start_vector=start_segmented,
+        end_vector=end_segmented,
+        vector_hex_code=LIGHT_GREEN,
+        change_hex_code=LIGHT_RED
+    )
+
+
 def set_overlay_session_states(raw_images, segmented_images):
     st.session_state.start_sat = raw_images[0]
     st.session_state.end_sat = raw_images[-1]
-    st.session_state.start_overlay = overlay_vector_on_image(
-        vector=segmented_images[0],
-        image=raw_images[0],
-        vector_hex_code=LIGHT_GREEN
+    (
+        st.session_state.start_overlay,
+        st.session_state.end_overlay,
+        st.session_state.total_change_overlay
+    ) = create_overlays(
+        raw_images[0],
+        raw_images[-1],
+        segmented_images[0],
+        segmented_images[-1]
     )
-    st.session_state.end_overlay = overlay_vector_on_image(
-        vector=segmented_images[-1],
-        image=raw_images[-1],
-        vector_hex_code=LIGHT_GREEN
-    )
-    st.session_state.total_change_overlay = overlay_vector_on_image(
-        vector=segmented_images[0] - segmented_images[-1],
-        image=st.session_state.end_overlay,
-        vector_hex_code=LIGHT_RED
+
+
+def location_key(latitude, longitude):
+    return (round(float(latitude), 5), round(float(longitude), 5))
+
+
+def known_series(latitude, longitude) -> dict:
+    """Returns the dates already fetched for the location, mapped to their
+    (segmented image, raw image)."""
+    if st.session_state.get('series_location') != location_key(latitude, longitude):
+        return {}
+    return dict(st.session_state.series)
+
+
+def merge_into_series(latitude, longitude, image_dates, segmented_images, raw_images):
+    """Adds fetched dates to the time series of the location. The series is
+    started over when the location changes."""
+    if st.session_state.get('series_location') != location_key(latitude, longitude):
+        st.session_state.series_location = location_key(latitude, longitude)
+        st.session_state.series = {}
+    st.session_state.series.update(
+        zip(image_dates, zip(segmented_images, raw_images))
     )
 
 
@@ -89,7 +124,7 @@ def process_calculation_request(latitude, longitude, start_date, end_date):
         with st.session_state.input_spinner_placeholder, st.spinner(
             'Requesting satellite images from Sentinel-2 L2A API...'
         ):
-            st.session_state.response = request_satellite_images(
+            image_dates, segmented_images, raw_images, geojson = fetch_satellite_images(
                 url=API_URL,
                 latitude=latitude,
                 longitude=longitude,
@@ -99,11 +134,12 @@ def process_calculation_request(latitude, longitude, start_date, end_date):
         with st.session_state.input_spinner_placeholder, st.spinner(
             'Processing images and calculating metrics...'
         ):
-            image_dates, segmented_images, raw_images = parse_response(
-                st.session_state.response
-            )
             set_metrics_session_states(image_dates, segmented_images)
             set_overlay_session_states(raw_images, segmented_images)
+            st.session_state.geojson = geojson
+            merge_into_series(
+                latitude, longitude, image_dates, segmented_images, raw_images
+            )
             st.session_state.zoom = 12.5
     except (requests.RequestException, ValueError):
         st.markdown(
@@ -295,7 +331,8 @@ if 'zoom' not in st.session_state:
 inject_map(
     lng=st.session_state.longitude_input,
     lat=st.session_state.latitude_input,
-    zoom=st.session_state.zoom
+    zoom=st.session_state.zoom,
+    geojson=st.session_state.get('geojson')
 )
 st.session_state.input_spinner_placeholder = st.empty()
 
@@ -391,33 +428,33 @@ if st.session_state.get('output', False):
                     inject_total_change(st.session_state.cover_diff_ha, ' ha')
 
 if st.session_state.get("show_intervall_analytics", False):
-    st.session_state.intervall_response = request_satellite_images(
-        url=API_URL,
-        latitude=st.session_state.latitude_input,
-        longitude=st.session_state.longitude_input,
-        start_date=st.session_state.start_timeframe,
-        end_date=st.session_state.end_timeframe,
-        sample_number=st.session_state.sample_number
-    )
-    image_dates, segmented_images, raw_images = parse_response(
-        st.session_state.intervall_response
-    )
-    df = calculate_metrics(image_dates, segmented_images)
-    df_perc_cumu = df[["cover_diff_pp_cum"]].round(1).reset_index().rename(columns={
-        "date": "Dates",
-        "cover_diff_pp_cum": "Coverage Loss in %"}
-    )
-    df_ha_monthly = df[["loss_per_months_ha"]].round(1).reset_index().rename(columns={
-        "date": "Dates",
-        "loss_per_months_ha": "Monthy Loss in Hectar"}
-    )
+    fetched_images = {}
     with st.container(border=False):
         inject_bold_centered('Deforestation Over Time', font_em=2)
         with st.container(border=True):
-            cols = st.columns(len(image_dates))
-            for col, date, raw_image, segmented_image in zip(
-                cols, image_dates, raw_images, segmented_images
-            ):
+            # Render every date as soon as the backend has segmented it, dates
+            # fetched before are reused instead of being requested again.
+            stream = stream_cached_satellite_images(
+                url=STREAM_API_URL,
+                latitude=st.session_state.latitude_input,
+                longitude=st.session_state.longitude_input,
+                start_date=st.session_state.start_timeframe,
+                end_date=st.session_state.end_timeframe,
+                sample_number=st.session_state.sample_number,
+                known_images=known_series(
+                    st.session_state.latitude_input,
+                    st.session_state.longitude_input
+                )
+            )
+            # The first item lists all dates in order, which lays out the
+            # columns chronologically whatever order the dates arrive in.
+            all_dates = next(stream, [])
+            cols = dict(zip(all_dates, st.columns(max(len(all_dates), 1))))
+            for date, segmented_image, raw_image in stream:
+                if date in fetched_images or date not in cols:
+                    continue
+                fetched_images[date] = (segmented_image, raw_image)
+                col = cols[date]
                 with col:
                     inject_bold_centered(date)
                 col.image(raw_image, use_column_width=True)
@@ -429,6 +466,25 @@ if st.session_state.get("show_intervall_analytics", False):
                     ),
                     use_column_width=True
                 )
+        image_dates = sorted(fetched_images)
+        segmented_images = [fetched_images[date][0] for date in image_dates]
+        raw_images = [fetched_images[date][1] for date in image_dates]
+        merge_into_series(
+            st.session_state.latitude_input,
+            st.session_state.longitude_input,
+            image_dates,
+            segmented_images,
+            raw_images
+        )
+        df = calculate_metrics(image_dates, segmented_images)
+        df_perc_cumu = df[["cover_diff_pp_cum"]].round(1).reset_index().rename(columns={
+            "date": "Dates",
+            "cover_diff_pp_cum": "Coverage Loss in %"}
+        )
+        df_ha_monthly = df[["loss_per_months_ha"]].round(1).reset_index().rename(columns={
+            "date": "Dates",
+            "loss_per_months_ha": "Monthy Loss in Hectar"}
+        )
         with st.container(border=True):
             col_a, col_b = st.columns(2)
             with col_a.container(border=False):
@@ -450,4 +506,4 @@ if st.session_state.get("show_intervall_analytics", False):
     with st.container(border=False):
         st.write(label(df).T)
 
-requests.get(url="https://forestvision-llzimbumzq-oe.a.run.app", timeout=10)
+backend_ready(API_URL)
@@ -0,0 +1,110 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Tuple
+import numpy as np
+import requests
+import streamlit as st
+from utils.response_parsing import (
+    request_satellite_images,
+    stream_satellite_images,
+    parse_response
+)
+
+
+API_CACHE_MAX_ENTRIES = int(os.getenv('API_CACHE_MAX_ENTRIES', '32'))
+API_CACHE_TTL_SECONDS = int(os.getenv('API_CACHE_TTL_SECONDS', str(24 * 3600)))
+READINESS_TTL_SECONDS = 60
+
+
+@st.cache_data(ttl=READINESS_TTL_SECONDS, show_spinner=False)
+def backend_ready(url: str) -> bool:
+    """
+    Asks the readiness probe of the backend serving url, which also wakes a
+    cold instance. Cached for READINESS_TTL_SECONDS, so reruns do not wait on
+    the backend again.
+    """
+    try:
+        return requests.get(url=f"{url.rsplit('/', 1)[0]}/readyz", timeout=10).ok
+    except requests.RequestException:
+        return False
+
+
+def request_key(latitude, longitude, start_date, end_date, sample_number=2) -> Tuple:
+    """
+    Normalises the request inputs, so that e.g. '-8.49' and -8.49 or a date
+    and its ISO string share one cache entry.
+    """
+    return (
+        round(float(latitude), 5),
+        round(float(longitude), 5),
+        str(start_date),
+        str(end_date),
+        int(sample_number)
+    )
+
+
+@st.cache_data(max_entries=API_CACHE_MAX_ENTRIES, ttl=API_CACHE_TTL_SECONDS, show_spinner=False)
+def _fetch_satellite_images(url: str, key: Tuple):
+    latitude, longitude, start_date, end_date, sample_number = key
+    response = request_satellite_images(
+        url=url,
+        latitude=latitude,
+        longitude=longitude,
+        start_date=start_date,
+        end_date=end_date,
+        sample_number=sample_number
+    )
+    response.raise_for_status()
+    return parse_response(response)
+
+
+def fetch_satellite_images(
+        url, latitude, longitude, start_date, end_date, sample_number=2
+    ) -> Tuple[List[str], List[np.ndarray], List[np.ndarray], dict]:
+    """
+    Memoised request_satellite_images and parse_response. Returns the decoded
+    (dates, segmented images, raw images, GeoJSON polygons), shared across
+    reruns and sessions. Failed requests raise and are not cached.
+    """
+    return _fetch_satellite_images(
+        url,
+        request_key(latitude, longitude, start_date, end_date, sample_number)
+    )
+
+
+@st.cache_resource
+def _stream_cache() -> Tuple["OrderedDict[Tuple, list]", threading.Lock]:
+    return OrderedDict(), threading.Lock()
+
+
+def stream_cached_satellite_images(
+        url, latitude, longitude, start_date, end_date, sample_number=2,
+        known_images: Dict[str, Tuple[np.ndarray, np.ndarray]] = None
+    ) -> Iterator:
+    """
+    Memoised stream_satellite_images, which first yields the sorted list of
+    all dates and then one (date, segmented image, raw image) per date.
+    A cached request is replayed at once, otherwise the results are yielded
+    as they stream in and cached once the stream is complete. known_images
+    only saves work on a miss, the results do not depend on it and it is not
+    part of the key. The cache is shared across sessions and keeps the
+    API_CACHE_MAX_ENTRIES most recently used requests.
+    """
+    key = request_key(latitude, longitude, start_date, end_date, sample_number)
+    cache, lock = _stream_cache()
+    with lock:
+        cached_results = cache.get(key)
+        if cached_results is not None:
+            cache.move_to_end(key)
+    if cached_results is not None:
+        yield from cached_results
+        return
+    results = []
+    for result in stream_satellite_images(url, *key, known_images=known_images):
+        results.append(result)
+        yield result
+    with lock:
+        cache[key] = results
+        while len(cache) > API_CACHE_MAX_ENTRIES:
+            cache.popitem(last=False)
@@ -1,6 +1,7 @@
+from typing import Tuple
 import numpy as np
 import cv2
-from PIL import Image, ImageFilter, ImageColor
+from PIL import ImageColor
 
 
 def bw_to_color(
@@ -15,64 +16,68 @@ def bw_to_color(
     return color_image
 
 
-def smooth_and_vectorize(array, hex_code, smoothing=9, opacity=0.5):
-    '''
-    Takes the model output array, smooths, colours, defines opacity,
-    and makes background transparent.
-    '''
-    array_resized = cv2.resize(array, (512, 512))
-    array_rgba = np.zeros((512, 512, 4), dtype=np.uint8)
-    # Copy the grayscale values to all RGB channels
-    array_rgba[:, :, 0] = array_resized
-    array_rgba[:, :, 1] = array_resized
-    array_rgba[:, :, 2] = array_resized
-    # Set alpha channel based on white pixels
-    array_rgba[:, :, 3] = np.where(array_resized == 255, 0, 255)
+def smooth_masks(vectors, size, smoothing=9) -> np.ndarray:
+    """
+    Median-smooths black and white vectors and returns where they are white
+    as a (len(vectors), height, width) boolean array. The vectors are stacked
+    as channels of one image, so up to four are smoothed in a single cv2 pass.
+    """
+    width, height = size
+    masks = np.empty((len(vectors), height, width), dtype=bool)
+    for start in range(0, len(vectors), 4):
+        chunk = [
+            vector if vector.shape == (height, width) else cv2.resize(vector, size)
+            for vector in vectors[start:start + 4]
+        ]
+        # cv2 filters images with one, three or four channels.
+        number_of_channels = {1: 1, 2: 3, 3: 3, 4: 4}[len(chunk)]
+        stacked = np.zeros((height, width, number_of_channels), dtype=np.uint8)
+        for channel, vector in enumerate(chunk):
+            stacked[:, :, channel] = vector
+        smoothed = cv2.medianBlur(stacked, smoothing).reshape(height, width, -1)
+        for channel in range(len(chunk)):
+            masks[start + channel] = smoothed[:, :, channel] > 127
+    return masks
 
-    image = Image.fromarray(array_rgba)
-    med_img = image.filter(ImageFilter.MedianFilter(size=smoothing))
 
-    # Convert the smoothed image to grayscale
-    smoothed_image = med_img.convert("L")
-    smoothed_array = np.array(smoothed_image)
+def blend_color(image, mask, color_layer, opacity, out, scratch) -> np.ndarray:
+    """Writes image into out, tinted with color_layer at the given opacity
+    where mask is True. scratch is a buffer of the image's shape."""
+    cv2.addWeighted(image, 1 - opacity, color_layer, opacity, 0, dst=scratch)
+    np.copyto(out, image)
+    np.copyto(out, scratch, where=mask[:, :, np.newaxis])
+    return out
 
-    # Binarize the smoothed image (invert the binary image)
-    _, binary_image = cv2.threshold(smoothed_array, 127, 255, cv2.THRESH_BINARY)
-    mask = Image.fromarray(binary_image).convert("L")
 
-    # Convert the hex code to RGB components
-    hex_code = hex_code.lstrip('#')
-    r = int(hex_code[0:2], 16)
-    g = int(hex_code[2:4], 16)
-    b = int(hex_code[4:6], 16)
-    opacity = int(opacity * 255)
-    rgba = (r, g, b, opacity)
-    color_img = Image.new("RGBA", image.size, rgba)
-
-    smooth_coloured_vector = Image.composite(
-        color_img,
-        Image.new("RGBA", image.size, (0, 0, 0, 0)),
-        mask
-    )
-    smooth_coloured_vector_rgba = smooth_coloured_vector.convert("RGBA")
-    return smooth_coloured_vector_rgba
-
-
-def overlay_vector_on_image(
-    vector: np.ndarray, image: Image.Image, vector_hex_code: str
-    ) -> Image.Image:
-    """Paste the vector on the image with the given hex code."""
-    smoothed_vector = smooth_and_vectorize(
-        array=vector,
-        hex_code=vector_hex_code
-    )
-    converted_image = (
-        Image.fromarray(image).convert('RGBA')
-        if isinstance(image, np.ndarray)
-        else image
-    )
-    overlayed_image = Image.alpha_composite(
-        im1=converted_image,
-        im2=smoothed_vector
+def render_overlays(
+    start_image: np.ndarray,
+    end_image: np.ndarray,
+    start_vector: np.ndarray,
+    end_vector: np.ndarray,
+    vector_hex_code: str,
+    change_hex_code: str,
+    smoothing=9,
+    opacity=0.5
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Renders the start, end and total change overlays in one batch. The forest
+    vectors are smoothed together, coloured with vector_hex_code and blended
+    onto their RGB images; the vanished forest (start minus end vector) is
+    then coloured with change_hex_code on top of the end overlay. Returns the
+    three overlays as RGB arrays backed by one buffer.
+    """
+    height, width = end_image.shape[:2]
+    masks = smooth_masks(
+        [start_vector, end_vector, start_vector - end_vector],
+        size=(width, height),
+        smoothing=smoothing
     )
-    return overlayed_image
+    overlays = np.empty((3, height, width, 3), dtype=np.uint8)
+    scratch = np.empty((height, width, 3), dtype=np.uint8)
+    color_layer = np.empty((height, width, 3), dtype=np.uint8)
+    color_layer[:] = ImageColor.getcolor(vector_hex_code, "RGB")
+    blend_color(start_image, masks[0], color_layer, opacity, overlays[0], scratch)
+    blend_color(end_image, masks[1], color_layer, opacity, overlays[1], scratch)
+    color_layer[:] = ImageColor.getcolor(change_hex_code, "RGB")
+    blend_color(overlays[1], masks[2], color_layer, opacity, overlays[2], scratch)
+    return overlays[0], overlays[1], overlays[2]
@@ -37,15 +37,41 @@ def create_polygon_layer(lng, lat):
     return polygon_layer
 
 
-def inject_map(lng, lat, zoom):
+def create_forest_layers(geojson):
+    """Returns GeoJSON layers with the forest polygons of the last date and
+    the forest lost since the first date."""
+    features = geojson.get("features", [])
+    forest_features = [f for f in features if f["properties"]["kind"] == "forest"]
+    loss_features = [f for f in features if f["properties"]["kind"] == "loss"]
+    layers = []
+    for layer_features, fill_color in (
+        (forest_features[-1:], [0, 178, 114, 90]),
+        (loss_features, [153, 70, 54, 160])
+    ):
+        if layer_features:
+            layers.append(pdk.Layer(
+                'GeoJsonLayer',
+                data={"type": "FeatureCollection", "features": layer_features},
+                get_fill_color=fill_color,
+                stroked=False,
+                filled=True,
+                pickable=False
+            ))
+    return layers
+
+
+def inject_map(lng, lat, zoom, geojson=None):
     view_state = pdk.ViewState(
         longitude=float(lng),
         latitude=float(lat),
         zoom=zoom
     )
+    layers = [create_polygon_layer(lng, lat)]
+    if geojson:
+        layers += create_forest_layers(geojson)
     st.pydeck_chart(pdk.Deck(
         map_style='mapbox://styles/mapbox/satellite-streets-v12',
         initial_view_state=view_state,
-        layers=[create_polygon_layer(lng, lat)],
+        layers=layers,
         tooltip=False
     ))
@@ -1,4 +1,3 @@
-import datetime as dt
 import numpy as np
 import pandas as pd
 from typing import List
@@ -7,58 +6,60 @@ from typing import List
 HECTAR_PER_IMAGE = 2621.44
 
 
-def day_difference_calculator(row):
-    try:
-        date_obj_1 = dt.datetime.strptime(row.date, '%Y-%m-%d').date()
-        date_obj_2 = dt.datetime.strptime(row.prev_date, '%Y-%m-%d').date()
-        difference = date_obj_1 - date_obj_2
-        return difference.days
-    except TypeError:
-        return pd.NA
-
-
-def date_reformatter(row):
-    try:
-        return dt.datetime.strptime(row.date, '%Y-%m-%d').date().strftime("%Y/%m")
-    except TypeError:
-        return pd.NA
-
-
 def convert_to_ha(percentage: float) -> float:
     ha = percentage / 100 * HECTAR_PER_IMAGE
     return ha
 
 
+def calculate_site_metrics(coverage_table: pd.DataFrame) -> pd.DataFrame:
+    """
+    Vectorised metrics engine for any number of sites. Takes a long table with
+    the columns site, date ('%Y-%m-%d') and coverage (%) and returns it sorted
+    by site and date with the change columns of calculate_metrics added, each
+    computed against the previous date of the same site. Dates are parsed once
+    into datetime64 and all differences are grouped shifts, so thousands of
+    dates times thousands of sites are handled in one call.
+    """
+    table = (
+        coverage_table[["site", "date", "coverage"]]
+        .assign(date=lambda df_: pd.to_datetime(df_.date, format='%Y-%m-%d'))
+        .sort_values(["site", "date"], kind="stable")
+        .reset_index(drop=True)
+    )
+    by_site = table.groupby("site", sort=False)
+    prev_coverage = by_site.coverage.shift(1)
+    cover_diff_pp = table.coverage - prev_coverage
+    cover_diff_ha = cover_diff_pp / 100 * HECTAR_PER_IMAGE
+    days_since_prev = (table.date - by_site.date.shift(1)).dt.days
+    months_since_prev = days_since_prev / 30.437
+    metrics = table.assign(
+        cover_diff_rel=cover_diff_pp / prev_coverage * 100,
+        cover_diff_pp=cover_diff_pp,
+        cover_diff_pp_cum=cover_diff_pp.fillna(0).groupby(table.site).cumsum(),
+        cover_diff_ha=cover_diff_ha,
+        cover_diff_ha_cum=cover_diff_ha.fillna(0).groupby(table.site).cumsum(),
+        days_since_prev=days_since_prev.fillna(0).astype(int),
+        months_since_prev=months_since_prev,
+        loss_per_months_ha=cover_diff_ha / months_since_prev,
+        date=np.char.replace(
+            np.datetime_as_string(table.date.to_numpy(), unit='M'), '-', '/'
+        )
+    )
+    return metrics.fillna(0)
+
+
 def calculate_metrics(
         dates: List[str],
         segmented_images: List[np.ndarray]
     ) -> pd.DataFrame:
-    coverage_list = [np.count_nonzero(arr == 0) / arr.size * 100 for arr in segmented_images]
-    coverage_list_inverted = [100 - cov for cov in coverage_list]
-    pd.set_option('future.no_silent_downcasting', True)
+    coverage_list = [np.count_nonzero(arr) / arr.size * 100 for arr in segmented_images]
     dataframe = (
-        pd.DataFrame({
+        calculate_site_metrics(pd.DataFrame({
+            "site": 0,
             "date": dates,
-            "coverage": coverage_list_inverted
-        })
-        .assign(prev_coverage=lambda df_: df_.coverage.shift(1))
-        .assign(prev_date=lambda df_: df_.date.shift(1))
-        .assign(cover_diff_rel=lambda df_: (
-            df_.coverage - df_.prev_coverage) / df_.prev_coverage * 100
-        )
-        .assign(cover_diff_pp=lambda df_: df_.coverage - df_.prev_coverage)
-        .assign(cover_diff_pp_cum=lambda df_: df_.cover_diff_pp.cumsum())
-        .assign(cover_diff_ha=lambda df_: (
-            df_.coverage - df_.prev_coverage) / 100 * HECTAR_PER_IMAGE
-        )
-        .assign(cover_diff_ha_cum=lambda df_: df_.cover_diff_ha.cumsum())
-        .assign(days_since_prev=lambda df_: df_.apply(day_difference_calculator, axis=1))
-        .assign(months_since_prev=lambda df_: df_.days_since_prev / 30.437)
-        .assign(loss_per_months_ha=lambda df_: df_.cover_diff_ha / df_.months_since_prev)
-        .drop(columns=["prev_coverage", "prev_date"])
-        .assign(date=lambda df_: df_.apply(date_reformatter, axis=1))
-        .fillna(0)
-        .infer_objects()
+            "coverage": coverage_list
+        }))
+        .drop(columns=["site"])
         .set_index("date")
     )
     return dataframe
@@ -1,11 +1,16 @@
 import io
+import json
 import base64
 import numpy as np
-from typing import List, Tuple
+from typing import Dict, Iterator, List, Tuple
+import msgpack
 import requests
 from PIL import Image
 
 
+MSGPACK_MEDIA_TYPE = 'application/x-msgpack'
+
+
 def base64_to_numpy(img_b64):
     """
     Takes a base64 encoded image array, decodes it and returns a (numpy) image array.
@@ -15,6 +20,25 @@ def base64_to_numpy(img_b64):
     return img_array
 
 
+def unpack_mask(packed_mask: bytes, shape: Tuple[int, int]) -> np.ndarray:
+    """
+    Takes a bit-packed mask and returns a black and white (0/255) image array.
+    """
+    bits = np.unpackbits(
+        np.frombuffer(packed_mask, dtype=np.uint8),
+        count=shape[0] * shape[1]
+    )
+    bits *= 255
+    return bits.reshape(shape)
+
+
+def decompress_rgb(img_bytes: bytes) -> np.ndarray:
+    """
+    Takes a PNG/WebP compressed image and returns an RGB image array.
+    """
+    return np.asarray(Image.open(io.BytesIO(img_bytes)).convert('RGB'))
+
+
 def request_satellite_images(url, latitude, longitude, start_date, end_date, sample_number=2):
     response = requests.get(
         url=url,
@@ -24,20 +48,91 @@ def request_satellite_images(url, latitude, longitude, start_date, end_date, sam
             'longitude': longitude,
             'latitude': latitude,
             'sample_number': sample_number,
-            'send_orginal_images': 'True'
+            'send_orginal_images': 'True',
+            'return_geojson': 'True'
         },
+        headers={'Accept': f'{MSGPACK_MEDIA_TYPE}, application/json'},
         timeout=60
     )
     return response
 
 
+def stream_satellite_images(
+        url, latitude, longitude, start_date, end_date, sample_number=2,
+        known_images: Dict[str, Tuple[np.ndarray, np.ndarray]] = None
+    ) -> Iterator:
+    """
+    Requests the streaming endpoint. First yields the sorted list of all dates
+    of the result, then (date, segmented image, raw image) for every date as
+    soon as the backend has processed it. known_images maps already fetched
+    dates to their (segmented image, raw image); the backend skips those dates
+    and they are yielded from known_images right away.
+    Raises a ValueError if the backend reports a failure midway.
+    """
+    known_images = known_images or {}
+    with requests.get(
+        url=url,
+        params={
+            'start_timeframe': start_date,
+            'end_timeframe': end_date,
+            'longitude': longitude,
+            'latitude': latitude,
+            'sample_number': sample_number,
+            'send_orginal_images': 'True',
+            'known_dates': ','.join(known_images)
+        },
+        stream=True,
+        timeout=60
+    ) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if not line:
+                continue
+            content = json.loads(line)
+            if "error" in content:
+                raise ValueError(f"Streaming failed: {content['error']}")
+            if "date" not in content:
+                yield sorted(set(
+                    content.get("date_list_loaded", [])
+                    + content.get("date_list_known", [])
+                ))
+                for date in content.get("date_list_known", []):
+                    yield (date, *known_images[date])
+                continue
+            yield (
+                content["date"],
+                base64_to_numpy(content["segmented_img"]),
+                base64_to_numpy(content["original_img"])
+            )
+
+
 def parse_response(
     response: requests.Response
-    ) -> Tuple[List[str], List[np.ndarray], List[Image.Image]]:
-    image_dates = response.json().get("date_list_loaded")
-    segmented_images_b64 = response.json().get("segmented_img_list")
+    ) -> Tuple[List[str], List[np.ndarray], List[Image.Image], (dict | None)]:
+    """
+    Decodes a get_satellite_images response once. Returns the dates, the
+    segmented images, the raw images and the forest and loss polygons as a
+    GeoJSON FeatureCollection, or None if the backend did not vectorise the
+    masks.
+    """
+    if response.headers.get('content-type', '').startswith(MSGPACK_MEDIA_TYPE):
+        content = msgpack.unpackb(response.content, raw=False)
+        image_dates = content.get("date_list_loaded")
+        mask_shape = tuple(content.get("mask_shape", (512, 512)))
+        segmented_images = [
+            unpack_mask(packed_mask, mask_shape)
+            for packed_mask in content.get("segmented_img_list")
+        ]
+        raw_images = [
+            decompress_rgb(img_bytes)
+            for img_bytes in content.get("original_img_list", [])
+        ]
+        return (image_dates, segmented_images, raw_images, content.get("geojson"))
+    content = response.json()
+    image_dates = content.get("date_list_loaded")
+    segmented_images_b64 = content.get("segmented_img_list")
     segmented_images = [base64_to_numpy(img_b64) for img_b64 in segmented_images_b64]
-    raw_images_b64 = response.json().get("original_img_list")
+    raw_images_b64 = content.get("original_img_list")
     raw_images = [base64_to_numpy(img_b64) for img_b64 in raw_images_b64]
-    parsed_response = (image_dates, segmented_images, raw_images)
+    parsed_response = (image_dates, segmented_images, raw_images, content.get("geojson"))
     return parsed_response